@@ -1,20 +1,26 @@
 
 import os
 import json
-import re
 import time
 import hashlib
 import uuid
+import importlib.util
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 from pydantic import BaseModel
-
-# Tier 2 Dependencies
-try:
-    from transformers import pipeline
-except ImportError:
+from llm_gateway import llm_gateway
+from genai_clients import genai_clients
+from durable_store import WriteBehindStore
+from toxicity_batcher import BatchedClassifier
+from toxicity_backends import load_classifier, AERGUS_BACKEND, AERGUS_MODEL
+from aergus_rules import RulePacks
+from verdict_cache import VerdictCache, Verdict
+from toxicity_prefilter import Prefilter, Tier2ScoreLog, tier2_positive
+
+# Tier 2 Dependencies (imported by load_tier2, off the import path)
+TIER2_AVAILABLE = importlib.util.find_spec("transformers") is not None
+if not TIER2_AVAILABLE:
     print("AERGUS WARNING: Transformers not found. Tier 2 disabled (System Vulnerable).")
-    pipeline = None
 
 # Tier 3 Dependencies
 try:
@@ -23,7 +29,11 @@ try:
 except ImportError:
     genai = None
 
-KARMA_FILE = "data/karma.json"
+DATA_DIR = os.getenv("DATA_DIR", "data")
+KARMA_FILE = os.path.join(DATA_DIR, "karma.json")
+HARASSMENT_FILE = os.path.join(DATA_DIR, "harassment.json")
+USER_PROFILES_FILE = os.path.join(DATA_DIR, "user_profiles.json")
+TELEMETRY_LOG = os.path.join(DATA_DIR, "telemetry.jsonl")
 
 class SafetyToken(BaseModel):
     """
@@ -38,37 +48,56 @@ class SafetyToken(BaseModel):
 class Aergus:
     def __init__(self):
         print("👁️ AERGUS: Awakening...")
-        self.karma = self._load_json("data/karma.json", default={})
-        self.harassment_scores = self._load_json("data/harassment.json", default={})
-        self.user_profiles = self._load_json("data/user_profiles.json", default={})
+        # Write-behind: penalties update memory; repeated updates to a user coalesce into
+        # one journal record per DURABLE_WRITE_BEHIND_S, flushed again at shutdown.
+        self.karma_store = WriteBehindStore(KARMA_FILE)
+        self.harassment_store = WriteBehindStore(HARASSMENT_FILE)
+        self.karma = self.karma_store.data
+        self.harassment_scores = self.harassment_store.data
+        self.user_profiles = self._load_json(USER_PROFILES_FILE, default={})
         
         self._secret_salt = os.getenv("AERGUS_SECRET", str(uuid.uuid4()))
 
         # --- Tier 1: The Reflex (Regex) ---
-        self.regex_patterns = [
-            r"(?i)(kill|hurt)\s+(yourself|me)",
-            r"(?i)(build|make)\s+a\s+bomb",
-            r"(?i)ignore\s+previous\s+instructions",
-            r"(?i)system\s+prompt",
-        ]
+        # Default + per-institution rule packs, each compiled to a single regex (see aergus_rules.py)
+        self.rules = RulePacks()
+
+        # Content verdicts for repeated messages under the same policy (see verdict_cache.py)
+        self.verdicts = VerdictCache()
         
         # --- Tier 2: The Sentry (Local BERT) ---
-        # --- Tier 2: The Sentry (Local BERT) ---
+        # Loaded by load_tier2() (in the background at server startup); scans must not run before it.
         self.classifier = None
-        if pipeline:
-            try:
-                print("AERGUS: Summoning Tier 2 Guardian (unitary/toxic-bert)...")
-                self.classifier = pipeline("text-classification", model="unitary/toxic-bert", top_k=None, device=-1)
-                print("AERGUS: Tier 2 Online (CPU Mode).")
-                # print("AERGUS: Tier 2 Disabled (Rate Limit Protection)")
-            except Exception as e:
-                print(f"AERGUS CRITICAL: Tier 2 Failed to Load: {e}")
-        
+        self.tier2 = None
+        self.tier2_backend = None
+        # Cheap first stage that clears obviously benign messages before BERT (see toxicity_prefilter.py)
+        self.prefilter = None
+        self.tier2_log = Tier2ScoreLog()
+
         # --- Tier 3: The Judge (Gemini) ---
         self.api_key = os.getenv("GOOGLE_API_KEY")
         self.client = None
         if self.api_key and genai:
-            self.client = genai.Client(api_key=self.api_key)
+            self.client = genai_clients.get(self.api_key)
+
+    def load_tier2(self):
+        """
+        Loads the Tier 2 classifier (slow: downloads/loads toxic-bert). Safe to call once per process.
+        Raises if transformers is installed but the model fails to load, so the startup
+        component is marked FAILED instead of serving with Tier 2 silently off.
+        """
+        if self.tier2 is not None or not TIER2_AVAILABLE:
+            return self.tier2
+        try:
+            print(f"AERGUS: Summoning Tier 2 Guardian ({AERGUS_MODEL}, backend={AERGUS_BACKEND})...")
+            self.classifier, self.tier2_backend = load_classifier()
+            self.tier2 = BatchedClassifier(self.classifier)
+            print(f"AERGUS: Tier 2 Online (CPU Mode, {self.tier2_backend}).")
+            self.prefilter = Prefilter.load()
+        except Exception as e:
+            print(f"AERGUS CRITICAL: Tier 2 Failed to Load: {e}")
+            raise
+        return self.tier2
 
     # --- Persistence Helpers ---
     def _load_json(self, path: str, default: dict) -> dict:
@@ -78,10 +107,6 @@ class Aergus:
             except: return default
         return default
 
-    def _save_json(self, path: str, data: dict):
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w') as f: json.dump(data, f)
-
     # --- Karma & Harassment ---
     def get_karma(self, user_id: str) -> int:
         return self.karma.get(user_id, 1000) # Default 1000 karma
@@ -95,8 +120,7 @@ class Aergus:
 
     def update_karma(self, user_id: str, delta: int):
         current = self.get_karma(user_id)
-        self.karma[user_id] = max(0, current + delta)
-        self._save_json("data/karma.json", self.karma)
+        self.karma_store.set(user_id, max(0, current + delta))
         print(f"👁️ AERGUS: User {user_id} Karma: {self.karma[user_id]}")
 
     def report_user_action(self, user_id: str, action: str, details: str):
@@ -107,8 +131,7 @@ class Aergus:
             self.update_karma(user_id, -20)
             # Increment Harassment Score
             current_h = self.get_harassment_score(user_id)
-            self.harassment_scores[user_id] = current_h + 10
-            self._save_json("data/harassment.json", self.harassment_scores)
+            self.harassment_store.set(user_id, current_h + 10)
             
         elif action == "CHEATING":
             self.update_karma(user_id, -100)
@@ -132,7 +155,7 @@ class Aergus:
         return token.signature == expected_sig
 
     # --- Core Scan ---
-    def scan_message(self, text: str, user_id: str) -> Tuple[bool, Optional[SafetyToken], str]:
+    async def scan_message(self, text: str, user_id: str) -> Tuple[bool, Optional[SafetyToken], str]:
         """
         Runs the 3-Tier Scan.
         Returns: (passed: bool, token: SafetyToken | None, reason: str)
@@ -146,45 +169,87 @@ class Aergus:
         if self.get_karma(user_id) < 50:
             return False, None, "🚫 Account Locked due to Low Karma."
 
-        # 2. Tier 1: Regex
-        for pattern in self.regex_patterns:
-            if re.search(pattern, text):
-                self.update_karma(user_id, -50)
-                return False, None, "Tier 1 violation detected."
-
-        # 3. Tier 2: Local BERT
-        if self.classifier:
+        # 2. Content verdict: cached per (message, policy), else Tiers 1-3
+        key = self.verdicts.make_key(text, self._policy(user_id))
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            start = time.perf_counter()
+            verdict = await self._classify(text, user_id)
+            self.verdicts.put(key, verdict, time.perf_counter() - start)
+
+        if verdict.karma_penalty:
+            self.update_karma(user_id, -verdict.karma_penalty)
+        if not verdict.passed:
+            return False, None, verdict.reason
+        return True, self._generate_token(user_id), verdict.reason
+
+    def _policy(self, user_id: str) -> tuple:
+        """Every per-user input that can change a content verdict."""
+        return (
+            self.is_minor(user_id),
+            self.get_age_band(user_id),
+            self.is_institution_restricted(user_id),
+            self.get_institution(user_id),  # selects the Tier 1 rule pack
+            self.rules.generation,
+        )
+
+    async def _classify(self, text: str, user_id: str) -> Verdict:
+        # Tier 1: Regex (one pass over the user's rule pack)
+        rule_id = self.rules.match(text, self.get_institution(user_id))
+        if rule_id:
+            return Verdict(False, f"Tier 1 violation detected ({rule_id}).", karma_penalty=50)
+
+        # Tier 2: Local BERT, behind the n-gram prefilter when one is trained
+        if self.tier2:
+            decision = self.prefilter.decide(text) if self.prefilter else "escalate"
+            if decision == "skip":
+                return Verdict(True, "Safe")
             try:
-                results = self.classifier(text)
+                # Micro-batched with concurrent scans on the inference thread
+                results = await self.tier2.classify(text)
                 # scores = { 'toxic': 0.9, 'severe_toxic': 0.1, ... }
-                scores = {r['label']: r['score'] for r in results[0]}
+                scores = {r['label']: r['score'] for r in results}
+                self.tier2_log.log(text, scores)
+                if decision == "audit":
+                    self.prefilter.record_audit(tier2_positive(scores))
                 
                 # CRITICAL THREATS (Instant Ban)
                 if scores.get('threat', 0) > 0.8 or scores.get('identity_hate', 0) > 0.8 or scores.get('severe_toxic', 0) > 0.8:
-                     self.update_karma(user_id, -50)
-                     return False, None, "Aergus Block: Severe Toxicity / Threat"
+                     return Verdict(False, "Aergus Block: Severe Toxicity / Threat", karma_penalty=50)
 
                 # SUSPICIOUS (Context Check)
                 # "Fuck you" vs "What the fuck" often both trigger 'toxic' or 'obscene'
                 suspicion_threshold = 0.6 if self.is_minor(user_id) else 0.7
                 if scores.get('toxic', 0) > suspicion_threshold or scores.get('obscene', 0) > 0.8 or scores.get('insult', 0) > 0.7:
-                     return self._tier_3_scan(text, user_id, context=f"Tier 2 Suspicion. Scores: {scores}")
+                     return await self._tier_3_scan(text, user_id, context=f"Tier 2 Suspicion. Scores: {scores}")
 
             except Exception as e:
                 print(f"Tier 2 Error: {e}")
+                return Verdict(True, "Safe", cacheable=False)
+        elif TIER2_AVAILABLE:
+            # Model still loading or failed to load: don't remember a verdict it never saw.
+            return Verdict(True, "Safe", cacheable=False)
 
-        return True, self._generate_token(user_id), "Safe"
+        return Verdict(True, "Safe")
 
     def get_user_age(self, user_id: str) -> int:
         return self.user_profiles.get(user_id, {}).get("age", 16) # Default to 16 (Student)
 
+    def get_age_band(self, user_id: str) -> str:
+        # Same bands as the Tier 3 prompt
+        age = self.get_user_age(user_id)
+        return "child" if age < 13 else "teen" if age < 18 else "adult"
+
+    def get_institution(self, user_id: str) -> Optional[str]:
+        return self.user_profiles.get(user_id, {}).get("institution_id")
+
     def is_institution_restricted(self, user_id: str) -> bool:
         return self.user_profiles.get(user_id, {}).get("institution_no_swearing", False)
 
-    def _tier_3_scan(self, text: str, user_id: str, context: str) -> Tuple[bool, Optional[SafetyToken], str]:
+    async def _tier_3_scan(self, text: str, user_id: str, context: str) -> Verdict:
         """Tier 3: The Judge (Deep Scan)"""
         if not self.client:
-             return True, self._generate_token(user_id), "Aergus Allowed (Tier 3 Unavailable)"
+             return Verdict(True, "Aergus Allowed (Tier 3 Unavailable)")
 
         try:
             age = self.get_user_age(user_id)
@@ -226,7 +291,8 @@ class Aergus:
             }}
             """
             
-            response = self.client.models.generate_content(
+            response = await llm_gateway.generate(
+                self.client,
                 model="gemini-2.0-flash-exp",
                 contents=prompt,
                 config=types.GenerateContentConfig(response_mime_type="application/json")
@@ -234,13 +300,12 @@ class Aergus:
             result = json.loads(response.text)
             
             if not result['safe']:
-                self.update_karma(user_id, -result.get('karma_penalty', 0))
-                return False, None, f"Aergus Judgment: {result['reason']}"
+                return Verdict(False, f"Aergus Judgment: {result['reason']}", karma_penalty=int(result.get('karma_penalty', 0)))
             
-            return True, self._generate_token(user_id), "Aergus Cleared"
+            return Verdict(True, "Aergus Cleared")
 
         except Exception:
-            return True, self._generate_token(user_id), "Aergus Error - Allowed"
+            return Verdict(True, "Aergus Error - Allowed", cacheable=False)
 
     # --- Creepy Logic ---
     def get_avatar_state(self, user_id: str) -> dict:
@@ -342,9 +407,9 @@ class Aergus:
         }
         
         # Ensure data directory exists
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(DATA_DIR, exist_ok=True)
         
-        with open("data/telemetry.jsonl", "a") as f:
+        with open(TELEMETRY_LOG, "a") as f:
             f.write(json.dumps(log_entry) + "\n")
 
 # Singleton Instance
@@ -0,0 +1,345 @@
+import os
+import re
+import json
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Aergus Tier 1: compiled rule packs.
+# A pack is a list of regex rules plus a list of blocked phrases. Every pack is compiled
+# once into ONE scan regex and reused:
+#   - the phrases become a trie-shaped alternation, e.g. "kill you|kill yourself"
+#     compiles to kill\s+you(?:rself)?, so adding phrases costs a branch rather than a full pass
+#   - each regex rule is indexed by a literal that every match must contain, e.g. "bomb"
+#     for (build|make)\s+a\s+bomb. The literals form a second trie; a literal hit runs
+#     only the rules keyed on it (the Aho-Corasick style prefilter RE2/Hyperscan use)
+#   - rules with no usable literal are added to the alternation as-is
+# A message is scanned once, however many rules the pack holds; individual rules only run
+# to confirm a literal hit and report which rule fired.
+#
+# Rules file (AERGUS_RULES_PATH, JSON). It is hot-reloaded when its mtime changes:
+#   {
+#     "default": {"patterns": [{"id": "bomb", "pattern": "(build|make)\\s+a\\s+bomb"}],
+#                 "phrases":  [{"id": "slur-list", "phrases": ["...", "..."]}, "single phrase"]},
+#     "tenants": {"<institution_id>": {"patterns": [...], "phrases": [...]}}
+#   }
+# A tenant's pack is its own rules plus "default", on top of the built-in rules below,
+# which always apply. Matching is case-insensitive.
+# If a reload fails to parse or compile, the previous packs stay active.
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+AERGUS_RULES_PATH = os.getenv("AERGUS_RULES_PATH", os.path.join(DATA_DIR, "aergus_rules.json"))
+AERGUS_RULES_RELOAD_S = float(os.getenv("AERGUS_RULES_RELOAD_S", "5"))
+
+# Built-in rules (the original Tier 1 regex list), part of every pack.
+BUILTIN_RULES = {
+    "default": {
+        "patterns": [
+            {"id": "self-harm-threat", "pattern": r"(kill|hurt)\s+(yourself|me)"},
+            {"id": "weapon-construction", "pattern": r"(build|make)\s+a\s+bomb"},
+            {"id": "prompt-injection", "pattern": r"ignore\s+previous\s+instructions"},
+            {"id": "prompt-extraction", "pattern": r"system\s+prompt"},
+        ],
+        "phrases": [],
+    },
+    "tenants": {},
+}
+
+_INLINE_CASE_FLAG = re.compile(r"^\(\?i\)")
+# Shortest literal worth indexing; rules without one are scanned as plain alternation branches.
+MIN_LITERAL = 3
+
+
+_BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def _uncapture(pattern: str) -> str:
+    """Turns plain capturing groups into (?:...) so they don't defeat sre's alternation optimizations."""
+    if _BACKREFERENCE.search(pattern):
+        return pattern
+    out = []
+    escaped = False
+    class_start = -1  # index of the first char inside an open [...], or -1
+    for i, ch in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif class_start >= 0:
+            if ch == "]" and i > class_start and not (i == class_start + 1 and pattern[class_start] == "^"):
+                class_start = -1
+        elif ch == "[":
+            class_start = i + 1
+        elif ch == "(" and not pattern.startswith("?", i + 1):
+            out.append("(?:")
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def normalize_phrase(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+
+def _required_literals(pattern: str) -> Optional[List[str]]:
+    """Lowercased literals, one of which occurs in every match of `pattern`; None if there are none
+    of at least MIN_LITERAL chars. Looks at top-level literal runs and top-level (a|b) groups."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    best: Optional[List[str]] = None
+
+    def consider(literals: Optional[List[str]]):
+        nonlocal best
+        if literals and min(map(len, literals)) >= MIN_LITERAL:
+            if best is None or min(map(len, literals)) > min(map(len, best)):
+                best = literals
+
+    run: List[str] = []
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        consider(["".join(run).lower()])
+        run = []
+        if op == sre_parse.SUBPATTERN:
+            inner = list(av[-1])
+            alternatives = inner[0][1][1] if len(inner) == 1 and inner[0][0] == sre_parse.BRANCH else [inner]
+        elif op == sre_parse.BRANCH:
+            alternatives = av[1]
+        else:
+            continue
+        leading = []
+        for alternative in alternatives:
+            prefix = []
+            for item_op, item_av in alternative:
+                if item_op != sre_parse.LITERAL:
+                    break
+                prefix.append(chr(item_av))
+            leading.append("".join(prefix).lower())
+        consider(leading)
+    consider(["".join(run).lower()])
+    return best
+
+
+def _trie_regex(phrases: List[str]) -> str:
+    """Alternation shaped like a trie over the phrases' characters. Optional suffixes are greedy, so the longest phrase wins."""
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end of phrase
+
+    def emit(node: dict) -> str:
+        ends = "" in node
+        branches = []
+        for ch in sorted(k for k in node if k):
+            atom = r"\s+" if ch == " " else re.escape(ch)
+            branches.append(atom + emit(node[ch]))
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if ends else body
+
+    return emit(trie)
+
+
+class CompiledPack:
+    """One scan regex for a set of rules; match() returns the id of the rule that fired."""
+
+    def __init__(self, patterns: List[Tuple[str, str]], phrases: List[Tuple[str, str]]):
+        self.rule_count = len(patterns) + len(phrases)
+        self.phrase_rules: Dict[str, str] = {}
+        for rule_id, phrase in phrases:
+            self.phrase_rules.setdefault(normalize_phrase(phrase), rule_id)
+
+        self.rules: List[Tuple[str, re.Pattern]] = []
+        self.by_literal: Dict[str, List[int]] = {}  # required literal -> indexes into self.rules
+        fallback: List[int] = []
+        for rule_id, pattern in patterns:
+            pattern = _INLINE_CASE_FLAG.sub("", pattern)
+            try:
+                rx = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"rule '{rule_id}': {e}")
+            self.rules.append((rule_id, rx))
+            literals = _required_literals(pattern)
+            if literals is None:
+                fallback.append(len(self.rules) - 1)
+            for literal in literals or ():
+                self.by_literal.setdefault(literal, []).append(len(self.rules) - 1)
+        self.fallback = fallback
+        self.min_literal = min(map(len, self.by_literal), default=0)
+
+        alternatives = []
+        if self.phrase_rules:
+            alternatives.append(rf"(?P<phrase>(?<!\w){_trie_regex(list(self.phrase_rules))}(?!\w))")
+        if self.by_literal:
+            alternatives.append(f"(?P<literal>{_trie_regex(list(self.by_literal))})")
+        # Capturing groups stop sre from factoring an alternation into a prefix/charset
+        # test, so fallback rules are joined without them (up to ~1000x faster).
+        fallback_alternatives = [f"(?:{_uncapture(self.rules[i][1].pattern)})" for i in fallback]
+        alternatives += fallback_alternatives
+        self.regex = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        # The fallback branches alone: when a literal wins the alternation at some position
+        # but its rules don't match, a fallback rule may still match at that same position.
+        self.fallback_regex = re.compile("|".join(fallback_alternatives), re.IGNORECASE) if fallback_alternatives else None
+
+    def _fallback_at(self, text: str, pos: int) -> Optional[str]:
+        if self.fallback_regex is None or not self.fallback_regex.match(text, pos):
+            return None
+        for i in self.fallback:
+            if self.rules[i][1].match(text, pos):
+                return self.rules[i][0]
+        return "unknown"
+
+    def match(self, text: str) -> Optional[str]:
+        if self.regex is None:
+            return None
+        checked = set()
+        pos = 0
+        while pos <= len(text):
+            m = self.regex.search(text, pos)
+            if m is None:
+                return None
+            if m.group("phrase") if self.phrase_rules else None:
+                return self.phrase_rules.get(normalize_phrase(m.group("phrase")), "phrase")
+            literal = m.group("literal") if self.by_literal else None
+            if literal:
+                # Only the rules keyed on this literal (or a prefix of it) can match: verify those.
+                literal = literal.lower()
+                for n in range(self.min_literal, len(literal) + 1):
+                    for i in self.by_literal.get(literal[:n], ()):
+                        if i not in checked:
+                            checked.add(i)
+                            if self.rules[i][1].search(text):
+                                return self.rules[i][0]
+                rule_id = self._fallback_at(text, m.start())
+                if rule_id:
+                    return rule_id
+                # Resume one char on: a literal may start inside this one.
+                pos = m.start() + 1
+                continue
+            return self._fallback_at(text, m.start()) or "unknown"
+        return None
+
+
+def _parse_pack(pack: dict, source: str) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    patterns, phrases = [], []
+    for i, rule in enumerate(pack.get("patterns", [])):
+        if isinstance(rule, str):
+            rule = {"pattern": rule}
+        patterns.append((rule.get("id") or f"{source}:pattern-{i}", rule["pattern"]))
+    for i, rule in enumerate(pack.get("phrases", [])):
+        if isinstance(rule, str):
+            rule = {"phrases": [rule]}
+        rule_id = rule.get("id") or f"{source}:phrase-{i}"
+        for phrase in rule.get("phrases", []):
+            if phrase.strip():
+                phrases.append((rule_id, phrase))
+    return patterns, phrases
+
+
+class RulePacks:
+    def __init__(self, path: str = AERGUS_RULES_PATH, reload_s: float = AERGUS_RULES_RELOAD_S):
+        self.path = path
+        self.reload_s = reload_s
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._rules: dict = BUILTIN_RULES
+        self._compiled: Dict[str, CompiledPack] = {}
+        self.generation = 0  # bumped on every rules swap; part of the verdict cache key
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+        self.hits: Dict[str, int] = {}
+        self._reload_if_changed(force=True)
+
+    def _reload_if_changed(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._checked_at < self.reload_s:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime and not force:
+            return
+        with self._lock:
+            if mtime is None:
+                rules, compiled = BUILTIN_RULES, {}
+            else:
+                try:
+                    with open(self.path, "r") as f:
+                        rules = json.load(f)
+                    rules.setdefault("default", {})
+                    rules.setdefault("tenants", {})
+                    compiled = {"": self._compile(rules, None)}
+                    for tenant in rules["tenants"]:
+                        compiled[tenant] = self._compile(rules, tenant)
+                except Exception as e:
+                    self._mtime = mtime  # don't retry a broken file until it changes again
+                    self.reload_errors += 1
+                    self.last_error = str(e)
+                    print(f"AERGUS: Rules file {self.path} rejected, keeping previous rules: {e}")
+                    return
+            self._rules = rules
+            self._compiled = compiled
+            self._mtime = mtime
+            self.generation += 1
+            self.last_error = None
+            if mtime is not None:
+                self.reloads += 1
+                print(f"AERGUS: Loaded Tier 1 rules from {self.path} ({len(rules['tenants'])} tenant packs).")
+
+    def _compile(self, rules: dict, tenant: Optional[str]) -> CompiledPack:
+        patterns, phrases = _parse_pack(BUILTIN_RULES["default"], "builtin")
+        if rules is not BUILTIN_RULES:
+            file_patterns, file_phrases = _parse_pack(rules.get("default", {}), "default")
+            patterns += file_patterns
+            phrases += file_phrases
+        if tenant:
+            tenant_patterns, tenant_phrases = _parse_pack(rules["tenants"].get(tenant, {}), tenant)
+            patterns += tenant_patterns
+            phrases += tenant_phrases
+        return CompiledPack(patterns, phrases)
+
+    def _pack(self, tenant: Optional[str]) -> CompiledPack:
+        key = tenant if tenant and tenant in self._rules["tenants"] else ""
+        pack = self._compiled.get(key)
+        if pack is None:
+            with self._lock:
+                pack = self._compiled.get(key)
+                if pack is None:
+                    pack = self._compiled[key] = self._compile(self._rules, key or None)
+        return pack
+
+    def match(self, text: str, tenant: Optional[str] = None) -> Optional[str]:
+        """Returns the id of the first rule that fires on `text`, or None."""
+        self._reload_if_changed()
+        rule_id = self._pack(tenant).match(text)
+        if rule_id is not None:
+            self.hits[rule_id] = self.hits.get(rule_id, 0) + 1
+        return rule_id
+
+    def stats(self) -> dict:
+        return {
+            "source": self.path if self._mtime is not None else "builtin",
+            "tenant_packs": len(self._rules["tenants"]),
+            "default_rules": self._pack(None).rule_count,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+            "hits": dict(sorted(self.hits.items(), key=lambda kv: kv[1], reverse=True)[:20]),
+        }
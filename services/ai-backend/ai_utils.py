@@ -1,8 +1,13 @@
 
+import os
+import time
 import logging
 import asyncio
-from typing import List, Any
+from collections import deque
+from typing import List, Any, Optional
 from google.genai import types
+from llm_gateway import llm_gateway
+from circuit_breaker import model_health, is_transient_error
 
 logger = logging.getLogger(__name__)
 
@@ -13,45 +18,156 @@ MODELS_TO_TRY = [
     "gemini-2.0-flash-lite-preview-02-05"
 ]
 
-async def generate_content_with_fallback(client, contents, config=None, system_instruction=None):
+# Hedging: if the primary chain has not answered after LLM_HEDGE_DELAY_MS (set it near the
+# observed p95, or "auto" to track it), the same prompt is also sent to HEDGE_MODEL and the
+# first answer wins; the loser is cancelled.
+HEDGE_MODEL = "gemini-2.5-flash-lite"
+HEDGE_DELAY_SETTING = os.getenv("LLM_HEDGE_DELAY_MS", "4000")
+HEDGE_MIN_SAMPLES = 20
+
+class HedgeStats:
+    def __init__(self):
+        self.requests = 0  # hedge-eligible calls only; hedge_rate is relative to these
+        self.unhedged_requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.latencies = deque(maxlen=200)  # seconds, successful primary attempts
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def delay(self) -> float:
+        if HEDGE_DELAY_SETTING == "auto":
+            p95 = self.p95()
+            return p95 if p95 is not None else 4.0
+        return float(HEDGE_DELAY_SETTING) / 1000
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        return {
+            "requests": self.requests,
+            "unhedged_requests": self.unhedged_requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "hedge_delay_ms": round(self.delay() * 1000),
+            "primary_p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+hedge_stats = HedgeStats()
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError("LLM deadline exceeded")
+    return remaining
+
+async def generate_content_with_fallback(client, contents, config=None, system_instruction=None, deadline: Optional[float] = None, hedge: bool = False):
     """
     Tries to generate content using a list of models.
     If 503 (Overloaded) or 429 (Quota) occurs, it moves to the next model.
+    Models whose circuit breaker is open (recent failures / Retry-After) are skipped.
+    `deadline` (time.monotonic() based) bounds the whole call; `hedge` races a backup
+    request on the lite model once the primary is slower than the hedge delay.
     """
+    # config object doesn't have system_instruction, it's a separate arg in SDK
+    # check SDK signature carefully. 
+    # In google-genai v0.2.0: client.models.generate_content(model=..., contents=..., config=...)
+    # Config can contain system_instruction.
+    final_config = config
+    if system_instruction and final_config:
+         final_config.system_instruction = system_instruction
+    elif system_instruction and not final_config:
+         final_config = types.GenerateContentConfig(system_instruction=system_instruction)
+
+    try:
+        if not hedge:
+            hedge_stats.unhedged_requests += 1
+            return await _generate_with_chain(client, contents, final_config, MODELS_TO_TRY, deadline)
+        return await _generate_hedged(client, contents, final_config, deadline)
+    except asyncio.TimeoutError:
+        hedge_stats.deadline_exceeded += 1
+        raise
+
+async def _generate_hedged(client, contents, config, deadline: Optional[float]):
+    hedge_stats.requests += 1
+    delay = hedge_stats.delay()
+    remaining = _remaining(deadline)
+    if remaining is not None:
+        delay = min(delay, remaining)
+    primary = asyncio.ensure_future(_generate_with_chain(client, contents, config, MODELS_TO_TRY, deadline))
+
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    # Primary is slow: fire the hedge and take whichever answers first.
+    hedge_stats.hedged += 1
+    logger.info(f"Hedging after {delay:.2f}s with {HEDGE_MODEL}")
+    backup = asyncio.ensure_future(_generate_with_chain(client, contents, config, [HEDGE_MODEL], deadline))
+    pending = {primary, backup}
+    last_exception = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        hedge_stats.hedge_wins += 1
+                    return task.result()
+                last_exception = task.exception()
+        raise last_exception
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _generate_with_chain(client, contents, config, models: List[str], deadline: Optional[float]):
     last_exception = None
 
-    for model_name in MODELS_TO_TRY:
+    for model_name in models:
+        breaker = model_health.breaker(model_name)
+        if not breaker.allow_request():
+            logger.info(f"Skipping model {model_name}: circuit {breaker.state}")
+            continue
         try:
             logger.info(f"Attempting generation with model: {model_name}")
-            
-            # config object doesn't have system_instruction, it's a separate arg in SDK
-            # check SDK signature carefully. 
-            # In google-genai v0.2.0: client.models.generate_content(model=..., contents=..., config=...)
-            # Config can contain system_instruction.
-            
-            final_config = config
-            if system_instruction and final_config:
-                 final_config.system_instruction = system_instruction
-            elif system_instruction and not final_config:
-                 final_config = types.GenerateContentConfig(system_instruction=system_instruction)
-
-            response = client.models.generate_content(
-                model=model_name,
-                contents=contents,
-                config=final_config
+            start = time.monotonic()
+            response = await asyncio.wait_for(
+                llm_gateway.generate(
+                    client,
+                    model=model_name,
+                    contents=contents,
+                    config=config
+                ),
+                timeout=_remaining(deadline)
             )
+            breaker.record_success()
+            if model_name == models[0]:
+                hedge_stats.latencies.append(time.monotonic() - start)
             return response
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # Out of budget or lost a hedge race: no verdict on the model's health.
+            breaker.abandon()
+            raise
         except Exception as e:
-            error_str = str(e)
             # Check for transient errors
-            if "503" in error_str or "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "Overloaded" in error_str:
+            if is_transient_error(e):
                 logger.warning(f"Model {model_name} failed with transient error: {e}. Trying next model...")
+                breaker.record_failure(e)
                 last_exception = e
                 continue
             else:
                 # If it's a 400 or other non-retriable error, raise immediately
+                breaker.release()
                 raise e
     
     # If we exhaust all models
-    logger.error("All fallback models failed.")
-    raise last_exception or Exception("All models failed")
+    logger.error("All fallback models failed or are unavailable (circuit open).")
+    raise last_exception or Exception("503 All models unavailable (circuit open)")
@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from search_index import STOP_WORDS
+
+# Per-course cache of /chat answers.
+# Exact hits are keyed on the whole normalized question (lowercased, whitespace collapsed,
+# trailing "?" dropped), so digits, operators, single-letter variables and negations all
+# count. Near-duplicates ("explain limits" / "explain the limit") are matched by Jaccard
+# similarity over content words, but only between questions whose numbers, symbols,
+# single characters and negations are identical and in the same order: "solve 2x + 3 = 7"
+# never matches "solve 2x + 5 = 9", nor "is this a function" "is this not a function".
+# Every entry records the course's RAG context version, and a lookup only accepts
+# entries built from the current version.
+
+CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "0.8"))
+CHAT_CACHE_TTL_S = float(os.getenv("CHAT_CACHE_TTL_S", str(24 * 3600)))
+CHAT_CACHE_MAX_MB = float(os.getenv("CHAT_CACHE_MAX_MB", "16"))
+CHAT_CACHE_MAX_PER_COURSE = int(os.getenv("CHAT_CACHE_MAX_PER_COURSE", "500"))
+
+ALL_COURSES = "*"
+
+
+QUESTION_TOKEN_RE = re.compile(r"[a-z0-9]+|[^\sa-z0-9]")
+# Contractions split into "isn" "'" "t", and the "t" already counts as a single character.
+NEGATIONS = {"no", "not", "nor", "never", "none", "nothing", "neither", "without", "cannot"}
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("? ")
+
+
+def question_signature(text: str) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+    """(tokens that must match exactly, in order; content words compared by similarity)."""
+    exact = []
+    content = set()
+    for token in QUESTION_TOKEN_RE.findall(normalize_question(text)):
+        if len(token) == 1 or token in NEGATIONS or not token.isalpha():
+            exact.append(token)
+            continue
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        content.add(token)
+    return tuple(exact), frozenset(content)
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ("exact", "tokens", "version", "answer", "context_used", "created_at", "size")
+
+    def __init__(self, question: str, version: int, answer: str, context_used: bool):
+        self.exact, self.tokens = question_signature(question)
+        self.version = version
+        self.answer = answer
+        self.context_used = context_used
+        self.created_at = time.time()
+        # Rough in-memory footprint: the answer string plus the token sets.
+        self.size = 2 * len(answer) + sum(50 + len(t) for t in self.tokens) + 50 * len(self.exact) + 200
+
+
+class ChatAnswerCache:
+    def __init__(self, max_bytes: int = int(CHAT_CACHE_MAX_MB * 1024 * 1024), similarity: float = CHAT_CACHE_SIMILARITY, ttl_s: float = CHAT_CACHE_TTL_S):
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # Global LRU over (course, question hash); per-course views for the similarity scan.
+        self._lru: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._courses: Dict[str, "OrderedDict[str, _Entry]"] = {}
+        self.total_bytes = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def _hash(question: str) -> str:
+        return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+
+    def _drop(self, course: str, key: str):
+        entry = self._lru.pop((course, key), None)
+        if entry is None:
+            return
+        self.total_bytes -= entry.size
+        bucket = self._courses.get(course)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._courses[course]
+
+    def _usable(self, entry: _Entry, version: int, now: float) -> bool:
+        return entry.version == version and now - entry.created_at <= self.ttl_s
+
+    def get(self, course_id: Optional[str], question: str, version: int) -> Optional[Tuple[str, bool]]:
+        """Returns (answer, context_used) for the question or a near-duplicate of it."""
+        if not normalize_question(question):
+            return None
+        course = course_id or ALL_COURSES
+        key = self._hash(question)
+        now = time.time()
+        with self._lock:
+            bucket = self._courses.get(course)
+            if not bucket:
+                self.misses += 1
+                return None
+
+            entry = bucket.get(key)
+            near = False
+            if entry is None:
+                exact, tokens = question_signature(question)
+                best = 0.0
+                if tokens:
+                    for candidate_key, candidate in bucket.items():
+                        if candidate.version != version or candidate.exact != exact or not candidate.tokens:
+                            continue
+                        score = _jaccard(tokens, candidate.tokens)
+                        if score >= self.similarity and score > best:
+                            best, entry, key = score, candidate, candidate_key
+                near = entry is not None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            if not self._usable(entry, version, now):
+                # Built from an older index version (or expired): never serve it.
+                self._drop(course, key)
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end((course, key))
+            bucket.move_to_end(key)
+            if near:
+                self.near_hits += 1
+            else:
+                self.exact_hits += 1
+            return entry.answer, entry.context_used
+
+    def put(self, course_id: Optional[str], question: str, version: int, answer: str, context_used: bool):
+        if not normalize_question(question):
+            return
+        course = course_id or ALL_COURSES
+        key = self._hash(question)
+        entry = _Entry(question, version, answer, context_used)
+        with self._lock:
+            self._drop(course, key)
+            bucket = self._courses.setdefault(course, OrderedDict())
+            # Entries from older versions can never hit again; clear them out first.
+            for old_key in [k for k, e in bucket.items() if e.version != version]:
+                self._drop(course, old_key)
+            bucket = self._courses.setdefault(course, OrderedDict())
+            bucket[key] = entry
+            self._lru[(course, key)] = entry
+            self.total_bytes += entry.size
+            while len(bucket) > CHAT_CACHE_MAX_PER_COURSE:
+                self._drop(course, next(iter(bucket)))
+            while self.total_bytes > self.max_bytes and len(self._lru) > 1:
+                self._drop(*next(iter(self._lru)))
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "courses": len(self._courses),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "stale_evictions": self.stale,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+chat_answer_cache = ChatAnswerCache()
@@ -0,0 +1,142 @@
+import os
+import re
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Per-model circuit breakers for the Gemini fallback chain.
+# Each model keeps a rolling window of transient failures (503/429). Once the window
+# trips, the model is skipped until its cooldown (or the provider's Retry-After / quota
+# reset) expires; then a single half-open probe decides whether it closes again.
+
+CB_WINDOW_S = float(os.getenv("LLM_CB_WINDOW_S", "60"))
+CB_MIN_CALLS = int(os.getenv("LLM_CB_MIN_CALLS", "4"))
+CB_FAILURE_RATE = float(os.getenv("LLM_CB_FAILURE_RATE", "0.5"))
+CB_CONSECUTIVE_FAILURES = int(os.getenv("LLM_CB_CONSECUTIVE_FAILURES", "3"))
+CB_OPEN_S = float(os.getenv("LLM_CB_OPEN_S", "30"))
+CB_MAX_OPEN_S = float(os.getenv("LLM_CB_MAX_OPEN_S", "600"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+TRANSIENT_MARKERS = ("503", "429", "RESOURCE_EXHAUSTED", "Overloaded")
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def is_transient_error(e: Exception) -> bool:
+    error_str = str(e)
+    return any(marker in error_str for marker in TRANSIENT_MARKERS)
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    """Reads the provider's back-off hint: a Retry-After header or a RetryInfo retryDelay."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = _RETRY_DELAY_RE.search(str(e))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.window = deque()  # (timestamp, ok)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.last_error: Optional[str] = None
+        self.opened_count = 0
+
+    def _trim(self, now: float):
+        while self.window and now - self.window[0][0] > CB_WINDOW_S:
+            self.window.popleft()
+
+    def allow_request(self) -> bool:
+        now = time.time()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        now = time.time()
+        self.window.append((now, True))
+        self._trim(now)
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.state = CLOSED
+
+    def record_failure(self, error: Exception):
+        now = time.time()
+        self.window.append((now, False))
+        self._trim(now)
+        self.consecutive_failures += 1
+        self.last_error = str(error)[:200]
+        self.probe_in_flight = False
+
+        failures = sum(1 for _, ok in self.window if not ok)
+        tripped = (
+            self.state == HALF_OPEN
+            or self.consecutive_failures >= CB_CONSECUTIVE_FAILURES
+            or (len(self.window) >= CB_MIN_CALLS and failures / len(self.window) >= CB_FAILURE_RATE)
+        )
+        retry_after = retry_after_seconds(error)
+        if tripped or retry_after:
+            cooldown = min(CB_MAX_OPEN_S, retry_after if retry_after else CB_OPEN_S)
+            self.state = OPEN
+            self.open_until = max(self.open_until, now + cooldown)
+            self.opened_count += 1
+
+    def release(self):
+        """Non-transient outcome (e.g. a 400): the model answered, so a probe counts as healthy."""
+        if self.state == HALF_OPEN:
+            self.record_success()
+
+    def abandon(self):
+        """The call was cancelled before an outcome; let another probe through."""
+        self.probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        self._trim(now)
+        failures = sum(1 for _, ok in self.window if not ok)
+        return {
+            "state": self.state,
+            "calls_in_window": len(self.window),
+            "failures_in_window": failures,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_s": round(max(0.0, self.open_until - now), 1) if self.state == OPEN else 0.0,
+            "times_opened": self.opened_count,
+            "last_error": self.last_error,
+        }
+
+
+class ModelHealth:
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(model)
+        return self.breakers[model]
+
+    def snapshot(self) -> dict:
+        return {name: b.snapshot() for name, b in self.breakers.items()}
+
+
+model_health = ModelHealth()
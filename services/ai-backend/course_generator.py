@@ -1,48 +1,68 @@
 import os
 import json
+import asyncio
 import logging
 from typing import List, Dict, Any
-from pypdf import PdfReader
-from google import genai
+from text_extraction import TextExtractor
+from llm_gateway import llm_gateway
+from genai_clients import genai_clients
+from generation_cache import generation_cache
+from safety_context import authorize
 from google.genai import types
 
 # Initialize Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Canned replies chat_with_context returns when no model answer was produced.
+CHAT_FALLBACK_PREFIXES = (
+    "SYSTEM ERROR:",
+    "I'm sorry, I can't answer that right now",
+    "I'm taking too long to think",
+    "My neural link is overloaded",
+    "I am currently experiencing high network traffic",
+    "I'm having trouble connecting",
+)
+
+
+def is_fallback_reply(response: str) -> bool:
+    return response.startswith(CHAT_FALLBACK_PREFIXES)
+
 class CourseGenerator:
     def __init__(self):
+        self.text_extractor = TextExtractor()
         try:
             api_key = os.getenv("GOOGLE_API_KEY")
             if not api_key:
                 logger.warning("GOOGLE_API_KEY not found. Helper will fall back to mock.")
                 self.client = None
             else:
-                self.client = genai.Client(api_key=api_key)
+                self.client = genai_clients.get(api_key)
         except Exception as e:
             logger.warning(f"GenAI Client not initialized: {e}. Falling back to mock generation.")
             self.client = None
 
     def parse_document(self, file_path: str) -> str:
-        """Extracts text from a PDF or Text file."""
-        text = ""
+        """Extracts text from a PDF or Text file (blocking; prefer parse_document_async)."""
         try:
-            if file_path.endswith('.pdf'):
-                reader = PdfReader(file_path)
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-            else:
-                with open(file_path, 'r') as f:
-                    text = f.read()
+            return self.text_extractor.extract_sync(file_path)
         except Exception as e:
             logger.error(f"Error parsing document: {e}")
             raise
-        return text
 
-    async def generate_structure(self, topic: str, content_text: str, module_count: int = 4, intensity: str = "standard") -> Dict[str, Any]:
+    async def parse_document_async(self, file_path: str, content_hash: str = None) -> str:
+        """Extracts text in a process pool, reusing cached text for identical files."""
+        try:
+            return await self.text_extractor.extract(file_path, content_hash)
+        except Exception as e:
+            logger.error(f"Error parsing document: {e}")
+            raise
+
+    async def generate_structure(self, topic: str, content_text: str, module_count: int = 4, intensity: str = "standard", bypass_cache: bool = False) -> Dict[str, Any]:
         """
         Uses Gemini to generate a structured course curriculum from the provided text.
         Returns a JSON object representing the course tree.
+        Identical requests are served from the generation cache unless bypass_cache is set.
         """
         if not self.client:
             return self._mock_course_structure(topic)
@@ -94,23 +114,21 @@ class CourseGenerator:
         """
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
             # Response text should be JSON due to mime_type, but let's be safe
-            course_structure = json.loads(response.text)
+            text = await self._generate_cached(
+                "gemini-2.5-flash", prompt, {"response_mime_type": "application/json"},
+                bypass_cache=bypass_cache, parse=json.loads
+            )
+            course_structure = json.loads(text)
             return course_structure
         except Exception as e:
             logger.error(f"Gemini generation failed: {e}")
             return self._mock_course_structure(topic)
 
-    async def generate_lesson_content(self, topic: str, context: str, level: str) -> str:
+    async def generate_lesson_content(self, topic: str, context: str, level: str, bypass_cache: bool = False) -> str:
         """
         Generates detailed lesson content (Markdown) for a specific topic.
+        Identical requests are served from the generation cache unless bypass_cache is set.
         """
         if not self.client:
              return f"# {topic}\n\n*Mock Content Generated*\n\nThis is a mock lesson content for **{topic}** because the AI service is unavailable.\n\n### Key Concepts\n- Concept 1\n- Concept 2\n\n### Summary\nLorem ipsum dolor sit amet."
@@ -141,22 +159,18 @@ class CourseGenerator:
         """
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    max_output_tokens=8192,
-                    temperature=0.7
-                )
+            return await self._generate_cached(
+                "gemini-2.5-flash", prompt, {"max_output_tokens": 8192, "temperature": 0.7},
+                bypass_cache=bypass_cache
             )
-            return response.text
         except Exception as e:
             logger.error(f"Lesson generation failed: {e}")
             return f"# Error Generating Content\n\nCould not generate content for {topic}. Error: {str(e)}"
 
-    async def verify_content_quality(self, content: str, topic: str) -> Dict[str, Any]:
+    async def verify_content_quality(self, content: str, topic: str, bypass_cache: bool = False) -> Dict[str, Any]:
         """
         Verifies educational content for factual accuracy and quality.
+        Identical requests are served from the generation cache unless bypass_cache is set.
         """
         if not self.client:
              return {"status": "pass", "feedback": "Mock Verification: Content looks good. (AI Offline)"}
@@ -184,18 +198,39 @@ class CourseGenerator:
         """
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
+            text = await self._generate_cached(
+                "gemini-2.5-flash", prompt, {"response_mime_type": "application/json"},
+                bypass_cache=bypass_cache, parse=json.loads
             )
-            return json.loads(response.text)
+            return json.loads(text)
         except Exception as e:
             logger.error(f"Quality Check failed: {e}")
             return {"status": "fail", "feedback": "System Error during verification.", "issues": [str(e)]}
 
+    async def _generate_cached(self, model: str, prompt: str, config: Dict[str, Any], bypass_cache: bool = False, parse=None) -> str:
+        """
+        Returns the response text for (model, prompt, config), from the generation cache when possible.
+        Only responses that `parse` accepts (when given) are stored, so failures are never cached.
+        """
+        key = generation_cache.make_key(model, prompt, config)
+        if not bypass_cache:
+            cached = await asyncio.to_thread(generation_cache.get, key)
+            if cached is not None:
+                logger.info(f"Generation cache hit ({key[:12]})")
+                return cached
+
+        response = await llm_gateway.generate(
+            self.client,
+            model=model,
+            contents=prompt,
+            config=types.GenerateContentConfig(**config)
+        )
+        text = response.text
+        if parse is not None:
+            parse(text)
+        await asyncio.to_thread(generation_cache.put, key, text)
+        return text
+
     def _mock_course_structure(self, topic: str) -> Dict[str, Any]:
         """Fallback mock structure if AI fails or key is missing."""
         return {
@@ -229,13 +264,13 @@ class CourseGenerator:
             ]
         }
 
-    async def chat_with_context(self, message: str, context: str, token: object, history: List[Dict[str, str]] = []) -> str:
+    async def chat_with_context(self, message: str, context: str, token: object, history: List[Dict[str, str]] = [], deadline: float = None) -> str:
         """
         Answers a user question based on the provided RAG context and history.
-        REQUIRES valid SafetyToken.
+        REQUIRES a cleared SafetyContext or a valid SafetyToken.
+        `deadline` (time.monotonic() based) caps the LLM call; slow primaries are hedged.
         """
-        from aergus import aergus
-        if not aergus.validate_token(token):
+        if not authorize(token):
              return "SYSTEM ERROR: Safety Protocol Violation. Aergus Token Invalid."
 
         if not self.client:
@@ -278,10 +313,15 @@ class CourseGenerator:
             response = await generate_content_with_fallback(
                 self.client,
                 contents=prompt,
-                system_instruction=system_instruction
+                system_instruction=system_instruction,
+                deadline=deadline,
+                hedge=True
             )
             
             return response.text
+        except asyncio.TimeoutError:
+            logger.warning("Chat generation exceeded its deadline.")
+            return "I'm taking too long to think right now (high load). Please try again in a few seconds."
         except Exception as e:
             error_msg = str(e)
             if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
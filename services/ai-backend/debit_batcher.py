@@ -0,0 +1,226 @@
+import os
+import time
+import uuid
+import socket
+import threading
+from typing import Dict, List, Optional
+
+from durable_store import JournaledStore
+
+# Write-behind debits for the hot paths (/chat, /generate-quiz, /generate-lesson).
+#
+# A spend first tries the user's local lease: part of the balance this process
+# reserved in the ledger. If the lease covers it, the debit is applied in memory and
+# appended to a local pending journal, with no ledger round-trip. A background thread
+# settles pending debits per user in one ledger write every ECONOMY_FLUSH_MS, or sooner
+# once ECONOMY_FLUSH_OPS debits are queued. Spends the lease cannot cover go to the
+# ledger directly.
+#
+# Hard limits still hold: every accepted debit is backed by balance reserved in the
+# ledger. If flushes keep failing past the lease TTL, at most one lease per user can
+# be spent twice. A crash loses nothing: on restart the pending journal is settled
+# against the previous holder's leases, and those leases are then released.
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+ECONOMY_PENDING_PATH = os.path.join(DATA_DIR, "economy_pending.json")
+ECONOMY_LEASE_OBOLS = float(os.getenv("ECONOMY_LEASE_OBOLS", "2.0"))
+ECONOMY_LEASE_TTL_S = float(os.getenv("ECONOMY_LEASE_TTL_S", "120"))
+ECONOMY_LEASE_IDLE_S = float(os.getenv("ECONOMY_LEASE_IDLE_S", "30"))
+ECONOMY_FLUSH_MS = float(os.getenv("ECONOMY_FLUSH_MS", "500"))
+ECONOMY_FLUSH_OPS = int(os.getenv("ECONOMY_FLUSH_OPS", "50"))
+
+HOLDER_KEY = "_holder"
+
+
+class _Lease:
+    __slots__ = ("remaining", "pending", "last_used", "renewed_at")
+
+    def __init__(self, remaining: float, now: float):
+        self.remaining = remaining
+        self.pending: List[tuple] = []  # (debit_id, amount, reason, created_at)
+        self.last_used = now
+        # Every settle renews the ledger-side expiry; flush renews quiet leases at half the TTL.
+        self.renewed_at = now
+
+
+class DebitBatcher:
+    def __init__(self, ledger, journal_path: str = ECONOMY_PENDING_PATH):
+        self.ledger = ledger
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._user_locks = [threading.Lock() for _ in range(64)]
+        self._leases: Dict[str, _Lease] = {}
+        self._pending_ops = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.local_debits = 0
+        self.direct_debits = 0
+        self.flushes = 0
+
+        self.journal = JournaledStore(journal_path)
+        self._recover()
+        self.journal.set(HOLDER_KEY, self.holder)
+
+    def _recover(self):
+        """Settles debits a previous process accepted but never flushed, then drops its leases."""
+        previous = self.journal.get(HOLDER_KEY)
+        by_user: Dict[str, List[tuple]] = {}
+        for debit_id, record in list(self.journal.data.items()):
+            if debit_id == HOLDER_KEY:
+                continue
+            by_user.setdefault(record["user_id"], []).append((record["amount"], record["reason"], record["created_at"]))
+        for user_id, debits in by_user.items():
+            self.ledger.settle(previous or self.holder, user_id, debits, release=float("inf"), ttl_s=ECONOMY_LEASE_TTL_S)
+        if previous:
+            self.ledger.release_holder(previous)
+        if by_user:
+            print(f"EconomySystem: Reconciled {sum(len(d) for d in by_user.values())} unflushed debits for {len(by_user)} users.")
+        for debit_id in list(self.journal.data.keys()):
+            self.journal.delete(debit_id)
+        self.journal.compact()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="economy-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush(release_all=True)
+        self.journal.sync()
+
+    def spend(self, user_id: str, amount: float, reason: str) -> Optional[float]:
+        """Debits against the local lease. Returns the lease's remaining amount, or None if the caller must go to the ledger."""
+        if amount > ECONOMY_LEASE_OBOLS:
+            return None
+        # The per-user lock serializes lease growth and journal writes for one user; the
+        # global lock is never held across ledger or journal I/O.
+        with self._user_locks[hash(user_id) % len(self._user_locks)]:
+            if not self._hold(user_id, amount):
+                with self._lock:
+                    lease = self._leases.get(user_id)
+                    held = lease.remaining if lease is not None else 0.0
+                granted = self.ledger.reserve(self.holder, user_id, ECONOMY_LEASE_OBOLS, minimum=amount - held, ttl_s=ECONOMY_LEASE_TTL_S)
+                # A flush may have released the lease meanwhile: _hold re-checks what is actually held now.
+                if not self._hold(user_id, amount, granted):
+                    return None
+            return self._debit(user_id, amount, reason)
+
+    def _hold(self, user_id: str, amount: float, granted: float = 0.0) -> bool:
+        """Adds `granted` to the lease, then takes `amount` out of it if it covers it."""
+        with self._lock:
+            lease = self._leases.get(user_id)
+            if lease is None:
+                if granted <= 0:
+                    return False
+                lease = self._leases[user_id] = _Lease(0.0, time.time())
+            lease.remaining += granted
+            if lease.remaining < amount:
+                return False
+            lease.remaining -= amount
+            lease.last_used = time.time()
+            return True
+
+    def _debit(self, user_id: str, amount: float, reason: str) -> Optional[float]:
+        """Journals a debit already held on the lease, then queues it for settlement."""
+        now = time.time()
+        debit_id = uuid.uuid4().hex
+        try:
+            self.journal.set(debit_id, {"user_id": user_id, "amount": amount, "reason": reason, "created_at": now})
+        except Exception as e:
+            print(f"EconomySystem: Failed to journal a debit for {user_id}: {e}")
+            with self._lock:
+                # The ledger still reserves it for us (even if a flush dropped the lease meanwhile).
+                self._leases.setdefault(user_id, _Lease(0.0, now)).remaining += amount
+            return None
+        with self._lock:
+            lease = self._leases.setdefault(user_id, _Lease(0.0, now))
+            lease.pending.append((debit_id, amount, reason, now))
+            lease.last_used = now
+            self._pending_ops += 1
+            self.local_debits += 1
+            if self._pending_ops >= ECONOMY_FLUSH_OPS:
+                self._wake.set()
+            return lease.remaining
+
+    def unsettled(self, user_id: str) -> float:
+        """Debits accepted locally but not yet written to the ledger."""
+        with self._lock:
+            lease = self._leases.get(user_id)
+            return sum(d[1] for d in lease.pending) if lease else 0.0
+
+    def flush(self, release_all: bool = False):
+        """Settles every lease with pending debits; idle leases are returned to the ledger."""
+        now = time.time()
+        batch = []
+        with self._lock:
+            for user_id, lease in list(self._leases.items()):
+                idle = release_all or now - lease.last_used > ECONOMY_LEASE_IDLE_S
+                renew = now - lease.renewed_at > ECONOMY_LEASE_TTL_S / 2
+                if not lease.pending and not idle and not renew:
+                    continue
+                debits, lease.pending = lease.pending, []
+                self._pending_ops -= len(debits)
+                release = 0.0
+                if idle:
+                    release, lease.remaining = lease.remaining, 0.0
+                    del self._leases[user_id]
+                batch.append((user_id, lease, debits, release))
+            self.flushes += 1
+
+        self._settle(batch)
+
+    def release(self, user_id: str):
+        """Settles the user's pending debits and returns the rest of their lease to the ledger."""
+        with self._lock:
+            lease = self._leases.pop(user_id, None)
+            if lease is None:
+                return
+            debits, lease.pending = lease.pending, []
+            self._pending_ops -= len(debits)
+            release, lease.remaining = lease.remaining, 0.0
+        self._settle([(user_id, lease, debits, release)])
+
+    def _settle(self, batch: list):
+        # Ledger I/O happens outside the lock so spends keep flowing during a flush.
+        for user_id, lease, debits, release in batch:
+            try:
+                self.ledger.settle(self.holder, user_id, [(a, r, t) for _, a, r, t in debits], release=release, ttl_s=ECONOMY_LEASE_TTL_S)
+            except Exception as e:
+                print(f"EconomySystem: Failed to settle debits for {user_id}: {e}")
+                with self._lock:
+                    # Still journaled and still reserved in the ledger: retry on the next flush.
+                    current = self._leases.setdefault(user_id, lease)
+                    current.pending[:0] = debits
+                    current.remaining += release
+                    self._pending_ops += len(debits)
+                continue
+            lease.renewed_at = time.time()
+            for debit_id, _, _, _ in debits:
+                self.journal.delete(debit_id)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(ECONOMY_FLUSH_MS / 1000.0)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"EconomySystem: Debit flush failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "leases": len(self._leases),
+                "leased_obols": round(sum(l.remaining for l in self._leases.values()), 2),
+                "pending_debits": self._pending_ops,
+                "local_debits": self.local_debits,
+                "direct_debits": self.direct_debits,
+                "flushes": self.flushes,
+            }
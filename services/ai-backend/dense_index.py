@@ -0,0 +1,177 @@
+import os
+import json
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Dense retrieval for RAGService.
+# Chunk embeddings are computed locally on CPU and stored per course as one contiguous
+# float32 matrix (L2-normalised rows) that is memory-mapped from disk, so cosine top-k
+# is a single matrix-vector product and pods on the same node share the page cache.
+
+EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("RAG_EMBEDDING_BATCH_SIZE", "32"))
+
+
+class ChunkEmbedder:
+    """Mean-pooled sentence embeddings from a small transformers encoder, loaded on first use (or at startup via load())."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._tokenizer = None
+        self._model = None
+        self._failed = not model_name
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.load()
+
+    @property
+    def ready(self) -> bool:
+        """True once the model is loaded. Unlike `available`, never triggers (or waits on) a load."""
+        return self._model is not None
+
+    def load(self) -> bool:
+        if self._model is not None:
+            return True
+        if self._failed:
+            return False
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    from transformers import AutoTokenizer, AutoModel
+                    print(f"RAGService: Loading embedding model ({self.model_name})...")
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    self._model = AutoModel.from_pretrained(self.model_name)
+                    self._model.eval()
+                except Exception as e:
+                    print(f"RAGService: Embeddings disabled, model failed to load: {e}")
+                    self._failed = True
+        return self._model is not None
+
+    def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Returns an (n, dim) float32 matrix of unit vectors, or None if embeddings are unavailable."""
+        if not self.load():
+            return None
+        import torch
+
+        batches = []
+        with torch.no_grad():
+            for start in range(0, len(texts), self.batch_size):
+                batch = texts[start:start + self.batch_size]
+                encoded = self._tokenizer(batch, padding=True, truncation=True, max_length=256, return_tensors="pt")
+                hidden = self._model(**encoded).last_hidden_state
+                mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                batches.append(torch.nn.functional.normalize(pooled, dim=1).numpy())
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.ascontiguousarray(np.concatenate(batches).astype(np.float32))
+
+
+class DenseIndex:
+    """
+    One course's embedding matrix. `rows[i]` is the (doc_id, chunk position) of matrix row i.
+    Files: <base>.npy (the matrix, memory-mapped) and <base>.meta.json (rows + difficulties).
+    The three are published together as one (matrix, rows, difficulties) snapshot, replaced
+    with a single assignment, so a concurrent search never pairs a new matrix with old rows.
+    """
+
+    def __init__(self, base_path: str, matrix: Optional[np.ndarray] = None, rows: Optional[List[Tuple[str, int]]] = None, difficulties: Optional[np.ndarray] = None):
+        self.base_path = base_path
+        self._snapshot = (matrix, rows or [], difficulties if difficulties is not None else np.zeros(0, dtype=np.int8))
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self._snapshot[0]
+
+    @property
+    def rows(self) -> List[Tuple[str, int]]:
+        return self._snapshot[1]
+
+    @property
+    def difficulties(self) -> np.ndarray:
+        return self._snapshot[2]
+
+    @property
+    def matrix_path(self) -> str:
+        return self.base_path + ".npy"
+
+    @property
+    def meta_path(self) -> str:
+        return self.base_path + ".meta.json"
+
+    @classmethod
+    def open(cls, base_path: str) -> "DenseIndex":
+        index = cls(base_path)
+        if os.path.exists(index.matrix_path) and os.path.exists(index.meta_path):
+            try:
+                with open(index.meta_path, "r") as f:
+                    meta = json.load(f)
+                index._snapshot = (
+                    np.load(index.matrix_path, mmap_mode="r"),
+                    [tuple(r) for r in meta["rows"]],
+                    np.asarray(meta["difficulties"], dtype=np.int8),
+                )
+            except Exception as e:
+                print(f"DenseIndex: Failed to open {base_path}: {e}")
+                index = cls(base_path)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def replace_document(self, doc_id: str, vectors: Optional[np.ndarray], difficulties: List[int]):
+        """Drops a document's rows and appends the new ones, then rewrites the files atomically."""
+        old_matrix, old_rows, old_difficulties = self._snapshot
+        keep = [i for i, (d, _) in enumerate(old_rows) if d != doc_id]
+        if len(keep) == len(old_rows) and vectors is None:
+            return
+
+        parts = []
+        if old_matrix is not None and keep:
+            parts.append(np.asarray(old_matrix[keep], dtype=np.float32))
+        rows = [old_rows[i] for i in keep]
+        diffs = [int(old_difficulties[i]) for i in keep]
+        if vectors is not None and len(vectors):
+            parts.append(vectors.astype(np.float32))
+            rows += [(doc_id, pos) for pos in range(len(vectors))]
+            diffs += [int(d) for d in difficulties]
+
+        if not rows:
+            for path in (self.matrix_path, self.meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._snapshot = (None, [], np.zeros(0, dtype=np.int8))
+            return
+
+        matrix = np.ascontiguousarray(np.concatenate(parts))
+        # Write-then-rename so readers holding the old mapping are never torn.
+        tmp_matrix = self.matrix_path + ".tmp"
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, matrix)
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump({"rows": rows, "difficulties": diffs}, f)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_meta, self.meta_path)
+
+        self._snapshot = (np.load(self.matrix_path, mmap_mode="r"), rows, np.asarray(diffs, dtype=np.int8))
+
+    def search(self, query_vector: np.ndarray, min_diff: int = 1, max_diff: int = 10, limit: int = 3) -> List[Tuple[float, Tuple[str, int]]]:
+        """Cosine top-k over rows within the difficulty range. Returns (similarity, (doc_id, position))."""
+        matrix, rows, difficulties = self._snapshot
+        if matrix is None or not rows or matrix.shape[1] != query_vector.shape[0]:
+            return []
+        scores = matrix @ query_vector
+        mask = (difficulties >= min_diff) & (difficulties <= max_diff)
+        scores = np.where(mask, scores, -np.inf)
+        k = min(limit, int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), rows[i]) for i in top]
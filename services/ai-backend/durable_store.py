@@ -0,0 +1,317 @@
+import os
+import json
+import time
+import zlib
+import atexit
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+# Crash-safe local JSON persistence shared by the backend's file-backed stores.
+#
+# atomic_write_json: write to a temp file in the same directory, fsync, rename over the
+# target. Readers see the old file or the new one, never a truncated one.
+#
+# JournaledStore: a JSON object kept in memory, persisted as a snapshot plus an
+# append-only write-ahead journal (`<path>.wal`). Every change is one checksummed
+# journal line. Lines are flushed to the OS immediately, so a process crash loses
+# nothing. fsync is group-committed every DURABLE_FSYNC_INTERVAL_S (0 = every write),
+# which bounds what a host crash can lose. Once the journal outgrows
+# DURABLE_COMPACT_BYTES it is folded into a fresh snapshot and truncated.
+#
+# WriteBehindStore: a JournaledStore for hot, low-value counters (e.g. Aergus karma).
+# set() only touches memory and marks the key dirty. Every DURABLE_WRITE_BEHIND_S the
+# dirty keys are appended as one journal write, so a burst of updates to one user costs
+# one record. sync_all() (shutdown/atexit) flushes them first. A crash can lose up to
+# one interval of updates.
+
+DURABLE_FSYNC_INTERVAL_S = float(os.getenv("DURABLE_FSYNC_INTERVAL_S", "0.2"))
+DURABLE_COMPACT_BYTES = int(os.getenv("DURABLE_COMPACT_BYTES", str(4 * 1024 * 1024)))
+DURABLE_WRITE_BEHIND_S = float(os.getenv("DURABLE_WRITE_BEHIND_S", "1.0"))
+
+JOURNAL_SUFFIX = ".wal"
+
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data: Any, indent: Optional[int] = None, fsync: bool = True):
+    """Replaces `path` with `data` as JSON, all or nothing."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        _fsync_dir(path)
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"DurableStore: Could not read {path}: {e}")
+        return default
+
+
+def _encode(record: dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":"))
+    return f"{zlib.crc32(payload.encode('utf-8')):08x}\t{payload}\n".encode("utf-8")
+
+
+def _decode(line: bytes) -> Optional[dict]:
+    try:
+        crc, payload = line.rstrip(b"\n").split(b"\t", 1)
+        if int(crc, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except (ValueError, json.JSONDecodeError):
+        return None
+
+
+class JournaledStore:
+    def __init__(self, path: str, indent: Optional[int] = None, fsync_interval_s: float = DURABLE_FSYNC_INTERVAL_S, compact_bytes: int = DURABLE_COMPACT_BYTES):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.indent = indent
+        self.fsync_interval_s = fsync_interval_s
+        self.compact_bytes = compact_bytes
+        self._lock = threading.RLock()
+        self._journal = None
+        self._journal_bytes = 0
+        self._unsynced = False
+        self.writes = 0
+        self.fsyncs = 0
+        self.compactions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.data: Dict[str, Any] = read_json(path, default={})
+        if not isinstance(self.data, dict):
+            self.data = {}
+        replayed = self._replay()
+        if replayed:
+            print(f"DurableStore: Replayed {replayed} journal records into {path}.")
+        self._journal = open(self.journal_path, "ab")
+        _register(self)
+
+    def _replay(self) -> int:
+        if not os.path.exists(self.journal_path):
+            return 0
+        applied = 0
+        good_offset = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                record = _decode(line) if line.endswith(b"\n") else None
+                if record is None:
+                    # Torn or corrupt tail from an interrupted write: drop it and everything after.
+                    break
+                self._apply(record)
+                applied += 1
+                good_offset += len(line)
+        if good_offset != os.path.getsize(self.journal_path):
+            print(f"DurableStore: Truncating damaged journal tail of {self.journal_path}.")
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_offset)
+        self._journal_bytes = good_offset
+        return applied
+
+    def _apply(self, record: dict):
+        path = record["path"]
+        target = self.data
+        for step in path[:-1]:
+            target = target[step]
+        if record["op"] == "set":
+            target[path[-1]] = record["value"]
+        elif record["op"] == "del":
+            if isinstance(target, dict):
+                target.pop(path[-1], None)
+            else:
+                del target[path[-1]]
+
+    def _append(self, record: dict):
+        self._append_many([record])
+
+    def _append_many(self, records: List[dict]):
+        data = b"".join(_encode(record) for record in records)
+        with self._lock:
+            for record in records:
+                self._apply(record)
+            self._journal.write(data)
+            self._journal.flush()
+            self._journal_bytes += len(data)
+            self.writes += len(records)
+            if self.fsync_interval_s <= 0:
+                self._fsync()
+            else:
+                self._unsynced = True
+            if self._journal_bytes >= self.compact_bytes:
+                self.compact()
+
+    # --- Mutations ---
+    def set(self, key: str, value: Any):
+        self._append({"op": "set", "path": [key], "value": value})
+
+    def set_many(self, items: Dict[str, Any]):
+        """Sets several keys with a single journal write."""
+        if items:
+            self._append_many([{"op": "set", "path": [key], "value": value} for key, value in items.items()])
+
+    def set_path(self, path: List[Any], value: Any):
+        """Sets a nested field, e.g. [course_id, "modules", 0, "lessons", 2, "content"]."""
+        self._append({"op": "set", "path": list(path), "value": value})
+
+    def delete(self, key: str):
+        self._append({"op": "del", "path": [key]})
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    # --- Durability ---
+    def _fsync(self):
+        os.fsync(self._journal.fileno())
+        self._unsynced = False
+        self.fsyncs += 1
+
+    def sync(self):
+        """Group commit: fsyncs everything appended since the last sync."""
+        with self._lock:
+            if self._unsynced and self._journal is not None:
+                self._fsync()
+
+    def compact(self):
+        """Writes a fresh snapshot and truncates the journal."""
+        with self._lock:
+            atomic_write_json(self.path, self.data, indent=self.indent)
+            self._journal.close()
+            self._journal = open(self.journal_path, "wb")
+            os.fsync(self._journal.fileno())
+            self._journal_bytes = 0
+            self._unsynced = False
+            self.compactions += 1
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self.sync()
+                self._journal.close()
+                self._journal = None
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self.data),
+            "journal_bytes": self._journal_bytes,
+            "writes": self.writes,
+            "fsyncs": self.fsyncs,
+            "compactions": self.compactions,
+        }
+
+
+class WriteBehindStore(JournaledStore):
+    def __init__(self, path: str, flush_interval_s: float = DURABLE_WRITE_BEHIND_S, **kwargs):
+        self.flush_interval_s = flush_interval_s
+        self._dirty: Dict[str, Any] = {}
+        self._last_flush = time.time()
+        self.updates = 0
+        self.flushes = 0
+        super().__init__(path, **kwargs)
+
+    def set(self, key: str, value: Any):
+        """Updates memory now; the journal record is written by the next flush."""
+        with self._lock:
+            self.data[key] = value
+            self._dirty[key] = value
+            self.updates += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._dirty.pop(key, None)
+            super().delete(key)
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.time()
+            if not self._dirty or self._journal is None:
+                return
+            dirty, self._dirty = self._dirty, {}
+            self.set_many(dirty)
+            self.flushes += 1
+
+    def flush_if_due(self):
+        if time.time() - self._last_flush >= self.flush_interval_s:
+            self.flush()
+
+    def sync(self):
+        self.flush()
+        super().sync()
+
+    def stats(self) -> dict:
+        return dict(super().stats(), updates=self.updates, flushes=self.flushes, dirty=len(self._dirty))
+
+
+# --- Shared group-commit flusher ---
+_stores: "weakref.WeakSet[JournaledStore]" = weakref.WeakSet()
+_flusher: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(DURABLE_FSYNC_INTERVAL_S if DURABLE_FSYNC_INTERVAL_S > 0 else 1.0)
+        for store in list(_stores):
+            if isinstance(store, WriteBehindStore):
+                try:
+                    store.flush_if_due()
+                except Exception as e:
+                    print(f"DurableStore: write-behind flush failed for {store.path}: {e}")
+        sync_all(flush_pending=False)
+
+
+def _register(store: JournaledStore):
+    global _flusher
+    _stores.add(store)
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="durable-store-fsync", daemon=True)
+            _flusher.start()
+
+
+def sync_all(flush_pending: bool = True):
+    """fsyncs every store. With flush_pending (shutdown/atexit), write-behind updates are journaled first."""
+    for store in list(_stores):
+        try:
+            if isinstance(store, WriteBehindStore) and not flush_pending:
+                JournaledStore.sync(store)
+            else:
+                store.sync()
+        except Exception as e:
+            print(f"DurableStore: fsync failed for {store.journal_path}: {e}")
+
+
+atexit.register(sync_all)
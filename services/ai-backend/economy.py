@@ -3,10 +3,16 @@ import json
 import time
 from datetime import datetime, timedelta
 
+from economy_ledger import SQLiteLedger, FirestoreLedger
+from debit_batcher import DebitBatcher
+
 
 DATA_DIR = os.getenv("DATA_DIR", "data") # Trigger Reload
 ECONOMY_DB_PATH = os.path.join(DATA_DIR, "economy_db.json")
+ECONOMY_SQLITE_PATH = os.path.join(DATA_DIR, "economy.db")
 GCP_PROJECT = os.getenv("GCP_PROJECT")
+# Small debits are applied against a local balance lease and settled in batches (see debit_batcher.py).
+ECONOMY_WRITE_BEHIND = os.getenv("ECONOMY_WRITE_BEHIND", "1") == "1"
 
 # Pricing Constants (Derived from $0.50 daily cap = 100 Obols)
 # 1 Obol = $0.005
@@ -23,14 +29,13 @@ class EconomySystem:
     def __init__(self):
         self.use_firestore = bool(GCP_PROJECT)
         self.firestore_client = None
-        self.collection = None
-        self.db = {} # In-memory cache
+        self.ledger = None
 
         if self.use_firestore:
             try:
                 from google.cloud import firestore
                 self.firestore_client = firestore.Client(project=GCP_PROJECT)
-                self.collection = self.firestore_client.collection("users")
+                self.ledger = FirestoreLedger(self.firestore_client, DAILY_CAP)
                 print(f"EconomySystem: Using Firestore (Project: {GCP_PROJECT})")
             except Exception as e:
                  print(f"EconomySystem Error: {e}. Fallback to local.")
@@ -38,83 +43,43 @@ class EconomySystem:
 
         if not self.use_firestore:
             os.makedirs(DATA_DIR, exist_ok=True)
-            self.db = self._load_db_local()
-        else:
-            # Firestore: We don't load EVERYTHING into memory on init.
-            # We fetch on demand per user.
-            pass
+            # SQLite ledger; an existing economy_db.json is imported on first start.
+            self.ledger = SQLiteLedger(ECONOMY_SQLITE_PATH, DAILY_CAP, legacy_json_path=ECONOMY_DB_PATH)
 
-    def _load_db_local(self):
-        if os.path.exists(ECONOMY_DB_PATH):
-            try:
-                with open(ECONOMY_DB_PATH, "r") as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-
-    def _save_db_local(self):
-        try:
-            with open(ECONOMY_DB_PATH, "w") as f:
-                json.dump(self.db, f, indent=2)
-        except Exception as e:
-            print(f"Failed to save economy DB: {e}")
-
-    def _get_user_data(self, user_id: str) -> dict:
-        if self.use_firestore:
-            doc = self.collection.document(user_id).get()
-            if doc.exists:
-                return doc.to_dict()
-            return {}
-        else:
-            return self.db.get(user_id, {})
+        self.batcher = DebitBatcher(self.ledger) if ECONOMY_WRITE_BEHIND else None
 
-    def _save_user_data(self, user_id: str, data: dict):
-        if self.use_firestore:
-            self.collection.document(user_id).set(data, merge=True)
-        else:
-            self.db[user_id] = data
-            self._save_db_local()
+    def start(self):
+        if self.batcher:
+            self.batcher.start()
 
-    def get_user_state(self, user_id: str):
-        now = time.time()
-        user_data = self._get_user_data(user_id)
-        
-        if not user_data:
-            user_data = {
-                "balance": DAILY_CAP,
-                "last_refill": now
-            }
-            self._save_user_data(user_id, user_data)
-        
-        # Check for Daily Refill
-        last_refill = user_data.get("last_refill", 0)
-        # If > 24 hours (86400 seconds) have passed
-        if now - last_refill > 86400:
-            user_data["balance"] = DAILY_CAP
-            user_data["last_refill"] = now
-            self._save_user_data(user_id, user_data)
-            print(f"💰 Daily Refilled for {user_id}")
-            
-        return user_data
-    
-    # Adapt check_balance and spend to use get_user_state which is now abstract
-    # (Existing methods use get_user_state, so logic holds, provided we update SAVE logic inside them)
+    def stop(self):
+        if self.batcher:
+            self.batcher.stop()
 
+    def get_user_state(self, user_id: str):
+        # Daily refill is applied lazily by the ledger when the row is read or debited.
+        return self.ledger.get_user_state(user_id)
 
     def check_balance(self, user_id: str) -> float:
-        return self.get_user_state(user_id)["balance"]
+        balance = self.get_user_state(user_id)["balance"]
+        if self.batcher:
+            balance -= self.batcher.unsettled(user_id)
+        return balance
 
     def spend(self, user_id: str, amount: float, reason: str) -> bool:
-        user_data = self.get_user_state(user_id)
-        if user_data["balance"] >= amount:
-            user_data["balance"] -= amount
-            # Track transaction log if needed, simple print for now
-            print(f"💸 {user_id} spent {amount:.2f} Obols on {reason}. Remaining: {user_data['balance']:.2f}")
-            self._save_user_data(user_id, user_data)
+        if self.batcher:
+            if self.batcher.spend(user_id, amount, reason) is not None:
+                return True
+            # The ledger counts our own lease as spoken for: hand it back before debiting directly.
+            self.batcher.release(user_id)
+        balance = self.ledger.spend(user_id, amount, reason)
+        if balance is not None:
+            if self.batcher:
+                self.batcher.direct_debits += 1
+            print(f"💸 {user_id} spent {amount:.2f} Obols on {reason}. Remaining: {balance:.2f}")
             return True
         else:
-            print(f"🚫 {user_id} insufficient funds for {reason}. Cost: {amount}, Has: {user_data['balance']}")
+            print(f"🚫 {user_id} insufficient funds for {reason}. Cost: {amount}")
             return False
 
     def award_reward(self, user_id: str, amount: float, event_id: str = None) -> bool:
@@ -123,21 +88,21 @@ class EconomySystem:
         If event_id is provided, ensures this reward is only given once per event_id.
         Returns True if awarded, False if already claimed.
         """
-        user_data = self.get_user_state(user_id)
-        
-        if event_id:
-            completed_events = user_data.get("completed_events", [])
-            if event_id in completed_events:
-                return False
-            
-            completed_events.append(event_id)
-            user_data["completed_events"] = completed_events
-            
-        user_data["balance"] += amount
-        print(f"💰 {user_id} rewarded {amount:.2f} Lepta. New Balance: {user_data['balance']:.2f}")
-        self._save_user_data(user_id, user_data)
+        balance = self.ledger.award(user_id, amount, event_id)
+        if balance is None:
+            return False
+        print(f"💰 {user_id} rewarded {amount:.2f} Lepta. New Balance: {balance:.2f}")
         return True
 
+    def transactions(self, user_id: str, limit: int = 50) -> list:
+        return self.ledger.transactions(user_id, limit)
+
+    def stats(self) -> dict:
+        stats = {"backend": "firestore" if self.use_firestore else "sqlite"}
+        if self.batcher:
+            stats["write_behind"] = self.batcher.stats()
+        return stats
+
     def estimate_cost(self, input_chars: int, output_chars: int) -> float:
         # Crude token estimation: 1 token ~= 4 chars
         input_tokens = input_chars / 4
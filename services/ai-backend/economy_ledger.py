@@ -0,0 +1,453 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Set
+
+# Storage backends for EconomySystem.
+# Both make a debit one atomic check-and-update: a spend either sees enough balance
+# and lands together with its transaction record, or it changes nothing. The daily
+# refill is computed when a row is read or debited, so no job has to sweep users.
+#
+# Leases back the write-behind path (DebitBatcher): a holder reserves part of a user's
+# balance, debits it in memory and settles the debits later in one write. Reserved
+# amounts are excluded from what direct spends and other holders can use, and an
+# unsettled lease expires on its own if its holder disappears.
+
+REFILL_INTERVAL_S = 86400
+REWARD_CACHE_USERS = int(os.getenv("REWARD_CACHE_USERS", "2000"))
+
+
+def _refilled(balance: float, last_refill: float, now: float, daily_cap: float):
+    """Returns (balance, last_refill) after applying a due daily refill."""
+    if now - last_refill > REFILL_INTERVAL_S:
+        return daily_cap, now
+    return balance, last_refill
+
+
+class ClaimedEvents:
+    """
+    In-memory per-user sets of reward event IDs known to be claimed, for the most recently
+    active users. A hit answers a repeated claim without touching storage; a miss falls
+    through to the keyed reward_events store, which stays the source of truth.
+    """
+
+    def __init__(self, max_users: int = REWARD_CACHE_USERS):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contains(self, user_id: str, event_id: str) -> bool:
+        with self._lock:
+            events = self._users.get(user_id)
+            if events is None:
+                return False
+            self._users.move_to_end(user_id)
+            return event_id in events
+
+    def add(self, user_id: str, event_id: str):
+        with self._lock:
+            events = self._users.get(user_id)
+            if events is None:
+                events = self._users[user_id] = set()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            events.add(event_id)
+
+
+class SQLiteLedger:
+    """Local ledger in SQLite (WAL mode): one row per user plus an append-only transactions table."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        balance REAL NOT NULL,
+        last_refill REAL NOT NULL,
+        completed_events TEXT NOT NULL DEFAULT '[]'
+    );
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        amount REAL NOT NULL,
+        reason TEXT,
+        event_id TEXT,
+        balance_after REAL NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id, created_at);
+    CREATE TABLE IF NOT EXISTS reward_events (
+        user_id TEXT NOT NULL,
+        event_id TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (user_id, event_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS leases (
+        holder TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        amount REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (holder, user_id)
+    );
+    """
+
+    def __init__(self, path: str, daily_cap: float, legacy_json_path: Optional[str] = None):
+        self.path = path
+        self.daily_cap = daily_cap
+        self.claimed = ClaimedEvents()
+        self._lock = threading.Lock()
+        # Autocommit mode; every write below opens its own BEGIN IMMEDIATE transaction.
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        if legacy_json_path:
+            self._migrate_json(legacy_json_path)
+        self._migrate_completed_events()
+
+    def _migrate_json(self, legacy_path: str):
+        """Imports economy_db.json (and its journal) once, when the ledger is still empty."""
+        if not os.path.exists(legacy_path):
+            return
+        if self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return
+        from durable_store import JournaledStore
+        legacy = JournaledStore(legacy_path)
+        rows = [
+            (uid, float(data.get("balance", self.daily_cap)), float(data.get("last_refill", 0)), json.dumps(data.get("completed_events", [])))
+            for uid, data in legacy.data.items()
+        ]
+        legacy.close()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("INSERT OR IGNORE INTO users (user_id, balance, last_refill, completed_events) VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute("COMMIT")
+        print(f"EconomySystem: Migrated {len(rows)} users from {legacy_path} into {self.path}.")
+
+    def _migrate_completed_events(self):
+        """Moves legacy users.completed_events JSON lists into reward_events (idempotent)."""
+        with self._lock:
+            rows = self.conn.execute("SELECT user_id, completed_events FROM users WHERE completed_events != '[]'").fetchall()
+            if not rows:
+                return
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            for user_id, events in rows:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO reward_events (user_id, event_id, created_at) VALUES (?, ?, ?)",
+                    [(user_id, event_id, now) for event_id in json.loads(events)],
+                )
+            self.conn.execute("UPDATE users SET completed_events = '[]' WHERE completed_events != '[]'")
+            self.conn.execute("COMMIT")
+        print(f"EconomySystem: Moved completed events of {len(rows)} users into reward_events.")
+
+    def _ensure_user(self, user_id: str, now: float):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, balance, last_refill) VALUES (?, ?, ?)",
+            (user_id, self.daily_cap, now),
+        )
+
+    def get_user_state(self, user_id: str) -> dict:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT balance, last_refill FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                self._ensure_user(user_id, now)
+                return {"balance": self.daily_cap, "last_refill": now}
+        balance, last_refill = _refilled(row[0], row[1], now, self.daily_cap)
+        return {"balance": balance, "last_refill": last_refill}
+
+    def spend(self, user_id: str, amount: float, reason: str) -> Optional[float]:
+        """Debits `amount` if the (refilled) balance covers it. Returns the new balance, or None."""
+        now = time.time()
+        refill_due = "(? - last_refill > ?)"
+        leased = "(SELECT COALESCE(SUM(amount), 0) FROM leases WHERE leases.user_id = users.user_id AND expires_at > ?)"
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure_user(user_id, now)
+                # Refill and debit in one conditional UPDATE: no read-modify-write window.
+                cursor = self.conn.execute(
+                    f"""
+                    UPDATE users SET
+                        balance = (CASE WHEN {refill_due} THEN ? ELSE balance END) - ?,
+                        last_refill = CASE WHEN {refill_due} THEN ? ELSE last_refill END
+                    WHERE user_id = ? AND (CASE WHEN {refill_due} THEN ? ELSE balance END) - {leased} >= ?
+                    """,
+                    (now, REFILL_INTERVAL_S, self.daily_cap, amount,
+                     now, REFILL_INTERVAL_S, now,
+                     user_id, now, REFILL_INTERVAL_S, self.daily_cap, now, amount),
+                )
+                if cursor.rowcount == 0:
+                    self.conn.execute("COMMIT")
+                    return None
+                balance = self.conn.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,)).fetchone()[0]
+                self.conn.execute(
+                    "INSERT INTO transactions (user_id, amount, reason, balance_after, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, -amount, reason, balance, now),
+                )
+                self.conn.execute("COMMIT")
+                return balance
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def award(self, user_id: str, amount: float, event_id: Optional[str] = None, reason: str = "Reward") -> Optional[float]:
+        """Credits `amount`. With an event_id, only the first award for it counts (returns None after)."""
+        if event_id and self.claimed.contains(user_id, event_id):
+            return None
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure_user(user_id, now)
+                if event_id:
+                    # Primary-key insert doubles as the idempotency check.
+                    inserted = self.conn.execute(
+                        "INSERT OR IGNORE INTO reward_events (user_id, event_id, created_at) VALUES (?, ?, ?)",
+                        (user_id, event_id, now),
+                    ).rowcount
+                    if not inserted:
+                        self.conn.execute("COMMIT")
+                        self.claimed.add(user_id, event_id)
+                        return None
+                balance, last_refill = self.conn.execute("SELECT balance, last_refill FROM users WHERE user_id = ?", (user_id,)).fetchone()
+                balance, last_refill = _refilled(balance, last_refill, now, self.daily_cap)
+                balance += amount
+                self.conn.execute(
+                    "UPDATE users SET balance = ?, last_refill = ? WHERE user_id = ?",
+                    (balance, last_refill, user_id),
+                )
+                self.conn.execute(
+                    "INSERT INTO transactions (user_id, amount, reason, event_id, balance_after, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, amount, reason, event_id, balance, now),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if event_id:
+            self.claimed.add(user_id, event_id)
+        return balance
+
+    # --- Leases ---
+    def _leased(self, user_id: str, now: float, exclude_holder: str) -> float:
+        return self.conn.execute(
+            "SELECT COALESCE(SUM(amount), 0) FROM leases WHERE user_id = ? AND holder != ? AND expires_at > ?",
+            (user_id, exclude_holder, now),
+        ).fetchone()[0]
+
+    def reserve(self, holder: str, user_id: str, amount: float, minimum: float, ttl_s: float) -> float:
+        """Grows `holder`'s lease on the user's balance by up to `amount`. Returns the granted amount (0 if below `minimum`)."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure_user(user_id, now)
+                balance, last_refill = self.conn.execute("SELECT balance, last_refill FROM users WHERE user_id = ?", (user_id,)).fetchone()
+                balance, last_refill = _refilled(balance, last_refill, now, self.daily_cap)
+                row = self.conn.execute("SELECT amount FROM leases WHERE holder = ? AND user_id = ?", (holder, user_id)).fetchone()
+                own = row[0] if row else 0.0
+                available = balance - own - self._leased(user_id, now, holder)
+                if available < minimum:
+                    self.conn.execute("COMMIT")
+                    return 0.0
+                granted = min(amount, available)
+                self.conn.execute("UPDATE users SET balance = ?, last_refill = ? WHERE user_id = ?", (balance, last_refill, user_id))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO leases (holder, user_id, amount, expires_at) VALUES (?, ?, ?, ?)",
+                    (holder, user_id, own + granted, now + ttl_s),
+                )
+                self.conn.execute("COMMIT")
+                return granted
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def settle(self, holder: str, user_id: str, debits: list, release: float, ttl_s: float) -> float:
+        """
+        Applies debits made against `holder`'s lease in one transaction. The lease shrinks
+        by the debited total plus `release` (pass float("inf") to drop it) and is renewed.
+        `debits` are (amount, reason, created_at) tuples. Lease changes are relative, so
+        they commute with a concurrent reserve() from the same holder.
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure_user(user_id, now)
+                balance, last_refill = self.conn.execute("SELECT balance, last_refill FROM users WHERE user_id = ?", (user_id,)).fetchone()
+                balance, last_refill = _refilled(balance, last_refill, now, self.daily_cap)
+                rows = []
+                for amount, reason, created_at in debits:
+                    balance -= amount
+                    rows.append((user_id, -amount, reason, balance, created_at))
+                self.conn.execute("UPDATE users SET balance = ?, last_refill = ? WHERE user_id = ?", (balance, last_refill, user_id))
+                self.conn.executemany(
+                    "INSERT INTO transactions (user_id, amount, reason, balance_after, created_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self.conn.execute(
+                    "UPDATE leases SET amount = amount - ?, expires_at = ? WHERE holder = ? AND user_id = ?",
+                    (sum(d[0] for d in debits) + min(release, 1e12), now + ttl_s, holder, user_id),
+                )
+                self.conn.execute("DELETE FROM leases WHERE holder = ? AND user_id = ? AND amount <= 1e-9", (holder, user_id))
+                self.conn.execute("COMMIT")
+                return balance
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def release_holder(self, holder: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM leases WHERE holder = ?", (holder,))
+
+    def transactions(self, user_id: str, limit: int = 50) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT amount, reason, event_id, balance_after, created_at FROM transactions WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, limit),
+            ).fetchall()
+        return [dict(zip(("amount", "reason", "event_id", "balance_after", "created_at"), row)) for row in rows]
+
+
+class FirestoreLedger:
+    """
+    users/{user_id} documents; each debit or award runs in a Firestore transaction.
+    Claimed reward events live in a users/{user_id}/reward_events subcollection.
+    """
+
+    def __init__(self, client, daily_cap: float):
+        from google.cloud import firestore
+        self._firestore = firestore
+        self.client = client
+        self.collection = client.collection("users")
+        self.daily_cap = daily_cap
+        self.claimed = ClaimedEvents()
+
+    def _load(self, snapshot, now: float) -> dict:
+        data = snapshot.to_dict() if snapshot.exists else None
+        if not data:
+            return {"balance": self.daily_cap, "last_refill": now}
+        data["balance"], data["last_refill"] = _refilled(data.get("balance", self.daily_cap), data.get("last_refill", 0), now, self.daily_cap)
+        return data
+
+    def get_user_state(self, user_id: str) -> dict:
+        ref = self.collection.document(user_id)
+        snapshot = ref.get()
+        if not snapshot.exists:
+            ref.set({"balance": self.daily_cap, "last_refill": time.time()}, merge=True)
+        data = self._load(snapshot, time.time())
+        if data.get("completed_events"):
+            self._migrate_legacy_events(user_id, data["completed_events"])
+        return {"balance": data["balance"], "last_refill": data["last_refill"]}
+
+    def _leased(self, data: dict, now: float, exclude_holder: Optional[str] = None) -> float:
+        leases = data.get("leases") or {}
+        return sum(l["amount"] for h, l in leases.items() if h != exclude_holder and isinstance(l, dict) and l.get("expires_at", 0) > now)
+
+    def _run(self, user_id: str, apply) -> Optional[float]:
+        """Runs apply(transaction, ref, data, now) in a transaction; it returns the transaction entries to record, or None to abort."""
+        ref = self.collection.document(user_id)
+
+        @self._firestore.transactional
+        def run(transaction):
+            now = time.time()
+            data = self._load(ref.get(transaction=transaction), now)
+            entries = apply(transaction, ref, data, now)
+            if entries is None:
+                return None
+            # Only the fields a ledger write changes; the rest of the user document is left alone.
+            update = {"balance": data["balance"], "last_refill": data["last_refill"]}
+            if "_lease_update" in data:
+                update["leases"] = data["_lease_update"]
+            transaction.set(ref, update, merge=True)
+            for entry in entries:
+                transaction.set(ref.collection("transactions").document(), dict(entry, created_at=entry.get("created_at", now)))
+            return data["balance"]
+
+        return run(self.client.transaction())
+
+    def spend(self, user_id: str, amount: float, reason: str) -> Optional[float]:
+        def apply(transaction, ref, data, now):
+            if data["balance"] - self._leased(data, now) < amount:
+                return None
+            data["balance"] -= amount
+            return [{"amount": -amount, "reason": reason, "balance_after": data["balance"]}]
+        return self._run(user_id, apply)
+
+    def award(self, user_id: str, amount: float, event_id: Optional[str] = None, reason: str = "Reward") -> Optional[float]:
+        if event_id and self.claimed.contains(user_id, event_id):
+            return None
+        legacy = []
+
+        def apply(transaction, ref, data, now):
+            legacy[:] = data.get("completed_events") or []
+            if event_id:
+                event_ref = ref.collection("reward_events").document(event_id)
+                if event_id in legacy or event_ref.get(transaction=transaction).exists:
+                    return None
+                transaction.create(event_ref, {"created_at": now})
+            data["balance"] += amount
+            return [{"amount": amount, "reason": reason, "event_id": event_id, "balance_after": data["balance"]}]
+
+        balance = self._run(user_id, apply)
+        if legacy:
+            self._migrate_legacy_events(user_id, legacy)
+        if event_id:
+            self.claimed.add(user_id, event_id)
+        return balance
+
+    def _migrate_legacy_events(self, user_id: str, events: list):
+        """Moves a user's completed_events list into the reward_events subcollection, then drops the field."""
+        ref = self.collection.document(user_id)
+        try:
+            for start in range(0, len(events), 400):
+                batch = self.client.batch()
+                for event_id in events[start:start + 400]:
+                    batch.set(ref.collection("reward_events").document(event_id), {"created_at": time.time()})
+                batch.commit()
+            ref.update({"completed_events": self._firestore.DELETE_FIELD})
+            print(f"EconomySystem: Moved {len(events)} completed events of {user_id} into reward_events.")
+        except Exception as e:
+            print(f"EconomySystem: Failed to migrate completed events of {user_id}: {e}")
+
+    # --- Leases (stored as a `leases.{holder}` map on the user document) ---
+    def reserve(self, holder: str, user_id: str, amount: float, minimum: float, ttl_s: float) -> float:
+        granted = [0.0]
+
+        def apply(transaction, ref, data, now):
+            own = ((data.get("leases") or {}).get(holder) or {}).get("amount", 0.0)
+            available = data["balance"] - own - self._leased(data, now, holder)
+            if available < minimum:
+                return None
+            granted[0] = min(amount, available)
+            data["_lease_update"] = {holder: {"amount": own + granted[0], "expires_at": now + ttl_s}}
+            return []
+
+        self._run(user_id, apply)
+        return granted[0]
+
+    def settle(self, holder: str, user_id: str, debits: list, release: float, ttl_s: float) -> float:
+        def apply(transaction, ref, data, now):
+            entries = []
+            for amount, reason, created_at in debits:
+                data["balance"] -= amount
+                entries.append({"amount": -amount, "reason": reason, "balance_after": data["balance"], "created_at": created_at})
+            held = ((data.get("leases") or {}).get(holder) or {}).get("amount", 0.0)
+            left = held - sum(d[0] for d in debits) - release
+            lease = {"amount": left, "expires_at": now + ttl_s} if left > 1e-9 else self._firestore.DELETE_FIELD
+            data["_lease_update"] = {holder: lease}
+            return entries
+        return self._run(user_id, apply)
+
+    def release_holder(self, holder: str):
+        # Leases of a departed holder expire on their own (ttl_s); nothing to sweep here.
+        pass
+
+    def transactions(self, user_id: str, limit: int = 50) -> list:
+        query = (self.collection.document(user_id).collection("transactions")
+                 .order_by("created_at", direction=self._firestore.Query.DESCENDING).limit(limit))
+        return [doc.to_dict() for doc in query.stream()]
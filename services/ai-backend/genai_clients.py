@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+import threading
+import contextlib
+from typing import Dict, Optional
+
+# Process-wide registry of google-genai clients.
+# One client per API key, built once with a keep-alive HTTP connection pool, so requests
+# stop paying TLS/HTTP setup. PoolMonitor tracks connections in use and how long callers
+# waited for one; LLMGateway takes a slot around every call.
+
+try:
+    from google import genai
+    from google.genai import types
+except ImportError:
+    genai = None
+
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "32"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "16"))
+LLM_POOL_KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY_S", "60"))
+
+
+class PoolMonitor:
+    def __init__(self, max_connections: int = LLM_POOL_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Holds one pool connection for the duration of an LLM call."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        start = time.perf_counter()
+        await self._semaphore.acquire()
+        wait = time.perf_counter() - start
+        self.acquired += 1
+        self.total_wait_s += wait
+        self.max_wait_s = max(self.max_wait_s, wait)
+        if wait > 0.001:
+            self.waited += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "avg_wait_ms": round(1000 * self.total_wait_s / self.acquired, 3) if self.acquired else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait_s, 3),
+        }
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._clients: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.pool = PoolMonitor()
+
+    def _build(self, api_key: str):
+        import httpx
+        limits = httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY_S,
+        )
+        try:
+            http_options = types.HttpOptions(client_args={"limits": limits}, async_client_args={"limits": limits})
+            return genai.Client(api_key=api_key, http_options=http_options)
+        except Exception as e:
+            # Older SDKs have no client_args; they still keep their own session alive.
+            print(f"GenAI: Custom pool limits unsupported ({e}). Using SDK defaults.")
+            return genai.Client(api_key=api_key)
+
+    def get(self, api_key: Optional[str] = None):
+        """Returns the shared client for `api_key` (default GOOGLE_API_KEY), or None if unavailable."""
+        api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        if not api_key or genai is None:
+            return None
+        client = self._clients.get(api_key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(api_key)
+                if client is None:
+                    client = self._build(api_key)
+                    self._clients[api_key] = client
+        return client
+
+    def stats(self) -> dict:
+        return dict(self.pool.stats(), clients=len(self._clients))
+
+
+genai_clients = ClientRegistry()
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Content-addressed cache for deterministic-input LLM generations.
+# Key = sha256(model, prompt hash, generation config). Each entry is one small JSON file
+# under DATA_DIR/gen_cache; an in-memory LRU index enforces the TTL and a total size cap.
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+GEN_CACHE_DIR = os.path.join(DATA_DIR, "gen_cache")
+GEN_CACHE_TTL_S = float(os.getenv("GEN_CACHE_TTL_S", str(7 * 24 * 3600)))
+GEN_CACHE_MAX_MB = float(os.getenv("GEN_CACHE_MAX_MB", "64"))
+
+
+class GenerationCache:
+    def __init__(self, cache_dir: str = GEN_CACHE_DIR, ttl_s: float = GEN_CACHE_TTL_S, max_bytes: int = int(GEN_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created_at, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # Rebuild the LRU from disk; last access time is kept in the file's mtime.
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                st = entry.stat()
+                entries.append((st.st_mtime, entry.name[:-5], st.st_size))
+        for mtime, key, size in sorted(entries):
+            self._index[key] = (mtime, size)
+            self.total_bytes += size
+
+    @staticmethod
+    def make_key(model: str, prompt: str, config: dict) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        material = json.dumps({"model": model, "prompt": prompt_hash, "config": config}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _drop(self, key: str):
+        _, size = self._index.pop(key, (0, 0))
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r") as f:
+                    entry = json.load(f)
+            except Exception:
+                self._drop(key)
+                self.misses += 1
+                return None
+            if time.time() - entry["created_at"] > self.ttl_s:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            os.utime(self._path(key))
+            self.hits += 1
+            return entry["value"]
+
+    def put(self, key: str, value: Any):
+        data = json.dumps({"created_at": time.time(), "value": value})
+        with self._lock:
+            if key in self._index:
+                self._drop(key)
+            tmp = self._path(key) + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(data)
+                os.replace(tmp, self._path(key))
+            except Exception as e:
+                print(f"GenerationCache: Failed to write entry: {e}")
+                return
+            self._index[key] = (time.time(), len(data))
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self._index) > 1:
+                self._drop(next(iter(self._index)))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+generation_cache = GenerationCache()
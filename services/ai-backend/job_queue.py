@@ -0,0 +1,214 @@
+import os
+import time
+import uuid
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from durable_store import atomic_write_json, read_json
+
+# In-process background jobs for heavy work (ingest, course generation).
+# A fixed number of asyncio workers bounds concurrency so long generations never
+# starve latency-sensitive traffic. Job state is mirrored to a small local table
+# so clients can still read results (or learn a job was interrupted) after a restart.
+#
+# The table holds status only and is rewritten atomically, off the event loop, when a
+# job changes state (progress ticks stay in memory). Results can be whole course
+# structures, so each is written to its own file and read back on first fetch.
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+JOBS_DB_PATH = os.path.join(DATA_DIR, "jobs.json")
+JOB_RESULTS_DIR = os.path.join(DATA_DIR, "job_results")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "500"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+
+class JobHandle:
+    """Passed to a running job so it can report progress."""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+
+    def progress(self, fraction: float, message: str = ""):
+        self._queue._update(self.job_id, persist=False, progress=round(max(0.0, min(1.0, fraction)), 3), message=message)
+
+
+JobFunc = Callable[[JobHandle], Awaitable[Any]]
+
+
+class JobQueue:
+    def __init__(self, path: str = JOBS_DB_PATH, workers: int = JOB_WORKERS, results_dir: str = JOB_RESULTS_DIR):
+        self.path = path
+        self.results_dir = results_dir
+        self.worker_count = workers
+        self.jobs: Dict[str, dict] = self._load()
+        self._pending: Dict[str, JobFunc] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._saver: Optional[asyncio.Task] = None
+        self._dirty: Optional[asyncio.Event] = None
+        self._expired_results: List[str] = []
+
+    # --- Job Table ---
+    def _load(self) -> Dict[str, dict]:
+        jobs = read_json(self.path, default={})
+        if not isinstance(jobs, dict):
+            print(f"JobQueue: Ignoring unreadable job table {self.path}")
+            jobs = {}
+        for job_id, job in jobs.items():
+            if job.get("result") is not None and not os.path.exists(self._result_path(job_id)):
+                # Tables from before results moved to their own files.
+                self._write_result(job_id, job["result"])
+            job["result"] = None  # loaded by fetch()
+            # Work in flight when the process died cannot be resumed (the callables are gone).
+            if job["status"] in (QUEUED, RUNNING):
+                job["status"] = INTERRUPTED
+                job["error"] = "Server restarted before the job finished. Please retry."
+        return jobs
+
+    def _result_path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def _table(self) -> Dict[str, dict]:
+        """Snapshot of the job table without results, taken on the event loop."""
+        return {job_id: {k: v for k, v in job.items() if k != "result"} for job_id, job in self.jobs.items()}
+
+    def _write(self, table: Dict[str, dict], expired: List[str]):
+        try:
+            atomic_write_json(self.path, table)
+        except Exception as e:
+            print(f"JobQueue: Failed to save job table: {e}")
+        for job_id in expired:
+            try:
+                os.remove(self._result_path(job_id))
+            except OSError:
+                pass
+
+    def _persist(self):
+        """Marks the table dirty; the saver task writes it from a worker thread."""
+        if self._dirty is not None:
+            self._dirty.set()
+
+    async def _save_loop(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            expired, self._expired_results = self._expired_results, []
+            await asyncio.to_thread(self._write, self._table(), expired)
+
+    def _update(self, job_id: str, persist: bool = True, **fields):
+        job = self.jobs[job_id]
+        job.update(fields, updated_at=time.time())
+        if persist:
+            self._persist()
+
+    def _trim(self):
+        finished = [j for j in self.jobs.values() if j["status"] not in (QUEUED, RUNNING)]
+        excess = len(self.jobs) - JOB_HISTORY_LIMIT
+        for job in sorted(finished, key=lambda j: j["updated_at"])[:max(0, excess)]:
+            del self.jobs[job["id"]]
+            if job["status"] == SUCCEEDED:
+                self._expired_results.append(job["id"])
+
+    def _write_result(self, job_id: str, result: Any):
+        try:
+            atomic_write_json(self._result_path(job_id), result, fsync=False)
+        except Exception as e:
+            # Still served from memory until the process restarts.
+            print(f"JobQueue: Failed to save result of job {job_id}: {e}")
+
+    # --- Public API ---
+    def submit(self, kind: str, func: JobFunc, **meta) -> dict:
+        """Schedules `func(handle)` and returns the new job record."""
+        if self._queue is None:
+            raise RuntimeError("JobQueue not started")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = {
+            "id": job_id,
+            "kind": kind,
+            "status": QUEUED,
+            "progress": 0.0,
+            "message": "Queued",
+            "meta": meta,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._trim()
+        self._persist()
+        self._pending[job_id] = func
+        self._queue.put_nowait(job_id)
+        return self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """The in-memory record. After a restart, `result` is None until fetch() loads it."""
+        return self.jobs.get(job_id)
+
+    async def fetch(self, job_id: str) -> Optional[dict]:
+        """The job record with its result, reading the result file if it is not in memory yet."""
+        job = self.jobs.get(job_id)
+        if job is not None and job["status"] == SUCCEEDED and job.get("result") is None:
+            job["result"] = await asyncio.to_thread(read_json, self._result_path(job_id), None)
+        return job
+
+    def stats(self) -> dict:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"workers": self.worker_count, "queued": self._queue.qsize() if self._queue else 0, "jobs": counts}
+
+    # --- Workers ---
+    async def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._dirty = asyncio.Event()
+        self._saver = asyncio.create_task(self._save_loop())
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        print(f"JobQueue: {self.worker_count} workers started.")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        if self._saver is not None:
+            self._saver.cancel()
+            await asyncio.gather(self._saver, return_exceptions=True)
+            self._saver = self._dirty = None
+        # Final write, so jobs interrupted by the shutdown are recorded as such.
+        expired, self._expired_results = self._expired_results, []
+        await asyncio.to_thread(self._write, self._table(), expired)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            func = self._pending.pop(job_id, None)
+            if func is None:
+                continue
+            self._update(job_id, status=RUNNING, message="Running")
+            try:
+                result = await func(JobHandle(self, job_id))
+                await asyncio.to_thread(self._write_result, job_id, result)
+                self._update(job_id, status=SUCCEEDED, progress=1.0, message="Done", result=result)
+            except asyncio.CancelledError:
+                self._update(job_id, status=INTERRUPTED, error="Server shutting down. Please retry.")
+                raise
+            except Exception as e:
+                print(f"JobQueue: Job {job_id} failed: {e}")
+                traceback.print_exc()
+                detail = getattr(e, "detail", None) or str(e)
+                self._update(job_id, status=FAILED, message="Failed", error=detail)
+
+
+job_queue = JobQueue()
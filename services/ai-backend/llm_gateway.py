@@ -0,0 +1,43 @@
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from genai_clients import genai_clients
+
+logger = logging.getLogger(__name__)
+
+# Single async entry point for every Gemini generation in the backend.
+# Uses the SDK's native async surface (client.aio) so many generations can be in flight
+# on one event loop; clients without it fall back to a bounded thread pool.
+
+LLM_EXECUTOR_THREADS = int(os.getenv("LLM_EXECUTOR_THREADS", "16"))
+
+
+class LLMGateway:
+    def __init__(self, executor_threads: int = LLM_EXECUTOR_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers=executor_threads, thread_name_prefix="llm")
+        self.in_flight = 0
+        self.total_calls = 0
+
+    async def generate(self, client, model: str, contents, config=None):
+        """Awaitable equivalent of client.models.generate_content(model=..., contents=..., config=...)."""
+        self.in_flight += 1
+        self.total_calls += 1
+        try:
+            async with genai_clients.pool.slot():
+                aio = getattr(client, "aio", None)
+                if aio is not None:
+                    return await aio.models.generate_content(model=model, contents=contents, config=config)
+                loop = asyncio.get_running_loop()
+                call = functools.partial(client.models.generate_content, model=model, contents=contents, config=config)
+                return await loop.run_in_executor(self._executor, call)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "total_calls": self.total_calls}
+
+
+llm_gateway = LLMGateway()
@@ -1,12 +1,17 @@
 
+# Installed first so the import-time profile (GET /startup) covers everything below.
+from startup import orchestrator, ComponentUnavailable, STARTUP_WAIT_TIMEOUT_S
 import os
 import re
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
+import time
+import asyncio
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 import random
-from rag_service import RAGService
-from course_generator import CourseGenerator
+from course_generator import CourseGenerator, is_fallback_reply
+from answer_cache import chat_answer_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,17 +29,87 @@ app.add_middleware(
 )
 
 
-rag_service = RAGService()
 course_generator = CourseGenerator()
-from persistence_service import PersistenceService
-persistence_service = PersistenceService()
-
+from durable_store import sync_all
 
+# --- HEAVY COMPONENTS (loaded in the background by the startup orchestrator) ---
+rag_service = None
+persistence_service = None
 # In-memory store for generated courses (Production would use Firestore)
-COURSES_DB = persistence_service.load_courses()
+COURSES_DB: Dict[str, dict] = {}
+economy = None
+
+def _load_rag():
+    global rag_service
+    from rag_service import RAGService
+    rag_service = RAGService()
+    return rag_service
+
+def _load_courses():
+    global persistence_service, COURSES_DB
+    from persistence_service import PersistenceService
+    persistence_service = PersistenceService()
+    COURSES_DB = persistence_service.load_courses()
+    return COURSES_DB
+
+def _load_economy():
+    global economy
+    from economy import economy as economy_system
+    economy_system.start()
+    economy = economy_system
+    return economy
+
+def _load_embedder():
+    if not rag_service.embedder.load():
+        raise RuntimeError("embedding model unavailable; search is lexical only")
+    return rag_service.embedder
+
+def _load_aergus():
+    aergus.load_tier2()
+    return aergus
+
+orchestrator.register("rag", _load_rag)
+orchestrator.register("courses", _load_courses)
+orchestrator.register("economy", _load_economy)
+orchestrator.register("aergus", _load_aergus)
+orchestrator.register("embedder", _load_embedder, depends_on=("rag",), required=False)
+
+def requires(*components: str):
+    """Route dependency: waits (up to STARTUP_WAIT_TIMEOUT_S) for components still loading, else 503."""
+    async def dependency():
+        for name in components:
+            try:
+                await orchestrator.wait(name)
+            except ComponentUnavailable as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(STARTUP_WAIT_TIMEOUT_S))})
+    return Depends(dependency)
+
+# --- BACKGROUND JOBS ---
+from job_queue import job_queue
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+    await orchestrator.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    course_generator.text_extractor.shutdown()
+    # Settle write-behind debits and hand unused balance leases back to the ledger.
+    if economy is not None:
+        economy.stop()
+    # Group commit: make journal appends since the last fsync durable before exit.
+    sync_all()
 
 # --- AERGUS MODERATOR ---
-from aergus import aergus, SafetyToken
+# Cheap to import: the Tier 2 model is loaded by the "aergus" component above.
+from aergus import aergus
+from safety_context import SafetyContext, INTERNAL_BYPASS
+
+async def safety_context() -> SafetyContext:
+    """One per request: scans are deduplicated by content and the result is trusted downstream."""
+    return SafetyContext(aergus)
 
 
 
@@ -53,6 +128,8 @@ class AnomalyReport(BaseModel):
     anomaly_type: str
     details: str
 
+CHAT_DEADLINE_S = float(os.getenv("CHAT_DEADLINE_S", "20"))
+
 class ChatRequest(BaseModel):
     message: str
     course_id: Optional[str] = None
@@ -61,34 +138,43 @@ class ChatRequest(BaseModel):
     confirmed_warning: bool = False
 
 # --- ECONOMY SYSTEM ---
-from economy import economy
-
-@app.get("/balance/{user_id}")
+@app.get("/balance/{user_id}", dependencies=[requires("economy")])
 async def get_balance(user_id: str):
     return {"user_id": user_id, "balance": economy.check_balance(user_id)}
 
-@app.post("/ingest")
+@app.get("/transactions/{user_id}", dependencies=[requires("economy")])
+async def get_transactions(user_id: str, limit: int = 50):
+    return {"user_id": user_id, "transactions": economy.transactions(user_id, min(limit, 500))}
+
+@app.post("/ingest", dependencies=[requires("economy", "rag", "courses")])
 async def ingest_file(course_id: str = Form(...), file: UploadFile = File(...), user_id: str = Form("anonymous_hero")):
+    """
+    Stores the upload, then parses, structures and indexes it in a background job.
+    Returns 202 with a job_id to poll at /jobs/{job_id}.
+    """
     # 0. Check Balance Logic (Estimate)
-    # File usage: read content size
-    content = await file.read() # Read for size check
-    await file.seek(0) # Reset cursor for RAG service
+    # File usage: the upload is already spooled by Starlette, so take its size
+    # from the file position instead of reading it into memory.
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
     
     # Cost: Input chars
-    cost = economy.estimate_cost(len(content), 0)
+    cost = economy.estimate_cost(size, 0)
     
-    if not economy.spend(user_id, cost, f"File Ingest: {file.filename}"):
+    if not await asyncio.to_thread(economy.spend, user_id, cost, f"File Ingest: {file.filename}"):
          raise HTTPException(status_code=402, detail=f"Insufficient Obols. Cost: {cost:.2f}")
 
-    # 1. Ingest for RAG
+    # 1. Ingest for RAG (streams the upload to storage; must finish before the request ends)
     rag_result = await rag_service.ingest_file(file, course_id)
     
-    # 2. Generate Course Structure
-    # Re-read file path from rag_service logic (assumed saved)
-    file_path = os.path.join(rag_service.upload_dir, file.filename)
-    
-    try:
-        raw_text = course_generator.parse_document(file_path)
+    # 2. Parse, structure and index in the background
+    filename = file.filename
+    file_path = os.path.join(rag_service.upload_dir, filename)
+
+    async def run_ingest(job):
+        job.progress(0.1, "Parsing document")
+        raw_text = await course_generator.parse_document_async(file_path, rag_result["sha256"])
         # Note: /ingest currently generates structure implicitly. 
         # Ideally this should be separate or costed. 
         # For now, we costed the *ingest* based on size.
@@ -99,16 +185,18 @@ async def ingest_file(course_id: str = Form(...), file: UploadFile = File(...),
         # Try spend extra? Or just eat it. Let's just spend it if we can, else warn?
         # Simpler: The initial cost calculation included only input.
         # Let's double dip for structure generation cost
-        economy.spend(user_id, extra_cost, "Auto-Generate Structure")
+        await asyncio.to_thread(economy.spend, user_id, extra_cost, "Auto-Generate Structure")
 
+        job.progress(0.4, "Generating course structure")
         course_structure = await course_generator.generate_structure(course_id, raw_text)
         
         # Save to DB
         COURSES_DB[course_id] = course_structure
-        persistence_service.save_courses(COURSES_DB)
+        persistence_service.save_course(course_id, course_structure)
 
         # Index text for RAG
-        rag_service.add_text_to_index(course_id, file.filename, raw_text)
+        job.progress(0.7, "Indexing for retrieval")
+        await asyncio.to_thread(rag_service.add_text_to_index, course_id, filename, raw_text)
         
         return {
             "status": "success",
@@ -116,16 +204,36 @@ async def ingest_file(course_id: str = Form(...), file: UploadFile = File(...),
             "course_structure": course_structure,
             "cost_incurred": cost + extra_cost
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/courses/{course_id}")
+    job = job_queue.submit("ingest", run_ingest, course_id=course_id, filename=filename, user_id=user_id)
+    return JSONResponse(status_code=202, content={
+        "status": "accepted",
+        "job_id": job["id"],
+        "rag_status": rag_result,
+        "cost_incurred": cost
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.fetch(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/progress")
+async def get_job_progress(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {k: job[k] for k in ("id", "kind", "status", "progress", "message", "error", "updated_at")}
+
+@app.get("/courses/{course_id}", dependencies=[requires("courses")])
 async def get_course(course_id: str):
     if course_id in COURSES_DB:
         return COURSES_DB[course_id]
     raise HTTPException(status_code=404, detail="Course not found")
 
-@app.get("/courses/user/{user_id}")
+@app.get("/courses/user/{user_id}", dependencies=[requires("courses")])
 async def get_user_courses(user_id: str):
     """
     Returns all courses. In a real app, filtering by user_id would happen here.
@@ -172,23 +280,24 @@ class LessonGenerationRequest(BaseModel):
     description: Optional[str] = ""
     module_index: Optional[int] = None
     lesson_index: Optional[int] = None
+    bypass_cache: bool = False # Force a fresh generation instead of the cached one
 
-@app.post("/generate-lesson")
-async def generate_lesson(request: LessonGenerationRequest):
+@app.post("/generate-lesson", dependencies=[requires("economy", "aergus", "rag", "courses")])
+async def generate_lesson(request: LessonGenerationRequest, safety: SafetyContext = Depends(safety_context)):
     """
     Generates detailed content for a specific lesson.
     """
     # Cost: Output approx 5k chars ~ 2.5 Obols
     COST = 2.5
-    if not economy.spend(request.user_id, COST, f"Generate Lesson: {request.topic}"):
+    if not await asyncio.to_thread(economy.spend, request.user_id, COST, f"Generate Lesson: {request.topic}"):
         raise HTTPException(status_code=402, detail=f"Insufficient Obols. Cost: {COST}")
 
     # 1. Retrieve Context (Internal Token)
-    passed, token, _ = aergus.scan_message(request.topic, request.user_id)
+    passed, _, _ = await safety.scan(request.topic, request.user_id)
     
     rag_context = ""
     if request.course_id:
-        rag_context = rag_service.search_context(request.topic, token if passed else "SAFETY_TOKEN_BYPASSED_INTERNAL", request.course_id)
+        rag_context = await asyncio.to_thread(rag_service.search_context, request.topic, safety if passed else INTERNAL_BYPASS, request.course_id)
     
     # Combine Contexts
     full_context = f"""
@@ -201,7 +310,7 @@ async def generate_lesson(request: LessonGenerationRequest):
     """
     
     # 2. Generate
-    content = await course_generator.generate_lesson_content(request.topic, full_context, request.level)
+    content = await course_generator.generate_lesson_content(request.topic, full_context, request.level, bypass_cache=request.bypass_cache)
     
     # 3. AUTO-SAVE Persistence
     # If we know where this lesson belongs, save it immediately to prevent data loss.
@@ -214,14 +323,14 @@ async def generate_lesson(request: LessonGenerationRequest):
                  if "lessons" in module and 0 <= request.lesson_index < len(module["lessons"]):
                      # Update and Save
                      module["lessons"][request.lesson_index]["content"] = content
-                     persistence_service.save_courses(COURSES_DB)
+                     persistence_service.save_lesson_content(request.course_id, request.module_index, request.lesson_index, content)
                      print(f"Auto-saved content for {request.course_id} M{request.module_index}:L{request.lesson_index}")
         except Exception as e:
              print(f"Warning: Auto-save failed: {e}")
 
     return {"content": content, "cost_incurred": COST}
 
-@app.post("/submit-assessment")
+@app.post("/submit-assessment", dependencies=[requires("economy")])
 async def submit_assessment(result: AssessmentResult):
     """
     Analyzes game performance and recommends the next learning path.
@@ -232,7 +341,7 @@ async def submit_assessment(result: AssessmentResult):
     if result.course_id and result.module_index is not None and result.lesson_index is not None:
         if percentage >= 70:
             event_id = f"LESSON_COMPLETE_{result.course_id}_{result.module_index}_{result.lesson_index}"
-            rewarded = economy.award_reward(result.user_id, 50, event_id)
+            rewarded = await asyncio.to_thread(economy.award_reward, result.user_id, 50, event_id)
             if rewarded:
                 print(f"🎉 Awarded 50 Lepta to {result.user_id} for completing {result.topic}")
     
@@ -267,29 +376,32 @@ class QualityCheckRequest(BaseModel):
     content: str
     topic: str
     user_id: str = "anonymous_hero"
+    bypass_cache: bool = False
 
-@app.post("/quality-check")
+@app.post("/quality-check", dependencies=[requires("economy")])
 async def quality_check(req: QualityCheckRequest):
     """
     Verifies lesson content quality. Cost: 1.5 Obols.
     """
     COST = 1.5
-    if not economy.spend(req.user_id, COST, "Quality Check"):
+    if not await asyncio.to_thread(economy.spend, req.user_id, COST, "Quality Check"):
         raise HTTPException(status_code=402, detail=f"Insufficient Obols for Quality Check. Cost: {COST}")
         
-    result = await course_generator.verify_content_quality(req.content, req.topic)
+    result = await course_generator.verify_content_quality(req.content, req.topic, bypass_cache=req.bypass_cache)
     return result
 
-@app.post("/chat")
-async def chat(request: ChatRequest):
+@app.post("/chat", dependencies=[requires("economy", "aergus", "rag")])
+async def chat(request: ChatRequest, safety: SafetyContext = Depends(safety_context)):
     """
     Context-aware study assistant chat.
     Protected by AERGUS.
     """
+    # Latency budget for the whole request, propagated down to the LLM layer
+    deadline = time.monotonic() + CHAT_DEADLINE_S
     
     # Economy Check: 0.1 Obol per chat message
     CHAT_COST = 0.1
-    if not economy.spend(request.user_id, CHAT_COST, "Chat Message"):
+    if not await asyncio.to_thread(economy.spend, request.user_id, CHAT_COST, "Chat Message"):
         return {"response": f"Insufficient Obols (Cost: {CHAT_COST}). Please wait for daily refill.", "context_used": False}
 
     # 0. Check for Warning Confirmation
@@ -298,22 +410,33 @@ async def chat(request: ChatRequest):
         request.user_context = (request.user_context or "") + "\n[System: User has explicitly CONFIRMED understanding of Content Warning for Sensitive Topics.]"
 
     # 1. Aergus Scan
-    passed, token, reason = aergus.scan_message(request.message, request.user_id)
+    passed, _, reason = await safety.scan(request.message, request.user_id)
     if not passed:
         raise HTTPException(status_code=403, detail=f"Aergus Blocked Interception: {reason}")
     
-    # 2. Retrieve Context (Passing Token)
-    context = rag_service.search_context(request.message, token, request.course_id)
+    # 2. Answer cache: a first-turn question already answered for this course's current
+    # materials is served without retrieval or generation.
+    cacheable = not request.history and not request.confirmed_warning
+    context_version = rag_service.context_version(request.course_id)
+    if cacheable:
+        cached = chat_answer_cache.get(request.course_id, request.message, context_version)
+        if cached:
+            answer, context_used = cached
+            return {"response": answer, "context_used": context_used, "cached": True}
+
+    # 3. Retrieve Context (Passing the cleared safety context)
+    context = await asyncio.to_thread(rag_service.search_context, request.message, safety, request.course_id)
     
-    # 3. Generate Response (Passing Token)
+    # 4. Generate Response (Passing the cleared safety context)
     response = await course_generator.chat_with_context(
         request.message, 
         context,
-        token,
-        request.history
+        safety,
+        request.history,
+        deadline=deadline
     )
     
-    # 4. Check for Aergus Flags from the AI
+    # 5. Check for Aergus Flags from the AI
     if response.startswith("[AERGUS_FLAG"):
         parts = response.split("]", 1)
         flag_part = parts[0]
@@ -322,13 +445,16 @@ async def chat(request: ChatRequest):
         aergus.report_user_action(request.user_id, "AI_ABUSE", reason)
         return {"response": actual_response.strip(), "context_used": bool(context)}
 
-    # 5. Check for AERGUS CONTENT_WARNING
+    # 6. Check for AERGUS CONTENT_WARNING
     if "[CONTENT_WARNING]" in response and not request.confirmed_warning:
         return {
             "response": "[CONTENT_WARNING]",
             "requires_confirmation": True,
             "warning_message": "This conversation touches on sensitive topics (Self-Harm, Violence, or Trauma). Proceed with caution?"
         }
+
+    if cacheable and not is_fallback_reply(response):
+        chat_answer_cache.put(request.course_id, request.message, context_version, response, bool(context))
     
     return {"response": response, "context_used": bool(context)}
 
@@ -336,6 +462,52 @@ async def chat(request: ChatRequest):
 def health_check():
     return {"status": "ok", "service": "ai-backend-gemini-2.5"}
 
+@app.get("/healthz")
+def liveness():
+    """Liveness: the process is serving. Component states are informational."""
+    return {"status": "ok", "components": orchestrator.snapshot()}
+
+@app.get("/readyz")
+def readiness():
+    """Readiness: 503 until every required component has loaded."""
+    body = {"ready": orchestrator.ready(), "components": orchestrator.snapshot()}
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+@app.get("/startup")
+def startup_report():
+    """Component load times and the slowest module imports."""
+    return orchestrator.report()
+
+@app.get("/metrics")
+async def get_metrics():
+    from genai_clients import genai_clients
+    from llm_gateway import llm_gateway
+    from ai_utils import hedge_stats
+    from generation_cache import generation_cache
+    return {
+        "llm_pool": genai_clients.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "jobs": job_queue.stats(),
+        "rag_store": rag_service.store.stats() if rag_service else None,
+        "llm_hedging": hedge_stats.snapshot(),
+        "generation_cache": generation_cache.stats(),
+        "chat_answer_cache": chat_answer_cache.stats(),
+        "course_store": persistence_service.stats() if persistence_service else None,
+        "economy": economy.stats() if economy else None,
+        "startup": orchestrator.snapshot(),
+        "aergus_rules": aergus.rules.stats(),
+        "aergus_verdicts": aergus.verdicts.stats(),
+        "aergus_state": {"karma": aergus.karma_store.stats(), "harassment": aergus.harassment_store.stats()},
+        "aergus_prefilter": aergus.prefilter.stats() if aergus.prefilter else None,
+        "aergus_tier2": dict(aergus.tier2.stats(), backend=aergus.tier2_backend) if aergus.tier2 else None,
+    }
+
+@app.get("/llm/health")
+async def get_llm_health():
+    """Per-model circuit breaker state used by the Gemini fallback chain."""
+    from circuit_breaker import model_health
+    return model_health.snapshot()
+
 @app.post("/report-anomaly")
 async def report_anomaly(report: AnomalyReport):
     """
@@ -366,8 +538,8 @@ class QuizRequest(BaseModel):
     context_notes: List[str] = [] # New: Explicit context from lesson notes
     context_content: Optional[str] = "" # New: Full lesson content fallback
 
-@app.post("/generate-quiz")
-async def generate_quiz(request: QuizRequest):
+@app.post("/generate-quiz", dependencies=[requires("economy", "aergus", "rag")])
+async def generate_quiz(request: QuizRequest, safety: SafetyContext = Depends(safety_context)):
     """
     Generates a quiz using Gemini 2.5 Flash.
     """
@@ -375,7 +547,7 @@ async def generate_quiz(request: QuizRequest):
     
     # Economy Check: 1 Obol per Arcade Round
     ARCADE_COST = 1.0
-    if not economy.spend(request.user_id, ARCADE_COST, "Arcade Round"):
+    if not await asyncio.to_thread(economy.spend, request.user_id, ARCADE_COST, "Arcade Round"):
         raise HTTPException(status_code=402, detail=f"Insufficient Obols for Arcade. Cost: {ARCADE_COST}")
 
     # --- ROUTING LOGIC ---
@@ -420,16 +592,17 @@ async def generate_quiz(request: QuizRequest):
     
     # Aergus Scan (Context + Topic)
     combined_input = f"{request.topic} {request.user_context or ''}"
-    passed, token, reason = aergus.scan_message(combined_input, request.user_id)
+    passed, _, reason = await safety.scan(combined_input, request.user_id)
     if not passed:
         raise HTTPException(status_code=403, detail=f"Aergus Blocked Quiz Generation: {reason}")
 
     clean_context = scrub_pii(request.user_context)
 
-    # Aergus Scan (Topic only)
-    passed, token, reason = aergus.scan_message(request.topic, request.user_id)
+    # Aergus Scan (Topic only). The topic is scanned on its own too: context around it
+    # can change the verdict. Without user context the request scope reuses the scan above.
+    passed, _, reason = await safety.scan(request.topic, request.user_id)
     if not passed:
-         raise HTTPException(status_code=403, detail=f"Aergus Blocked Quiz Generation: {reason}")
+        raise HTTPException(status_code=403, detail=f"Aergus Blocked Quiz Generation: {reason}")
 
     # Retrieve Course Context
     course_context = ""
@@ -443,9 +616,10 @@ async def generate_quiz(request: QuizRequest):
         elif d_lower == "elite" or d_lower == "spartan" or d_lower == "streamer": diff_range = (8, 10)
         
         # Search with difficulty filter
-        course_context = rag_service.search_context(
-            request.topic, 
-            token, 
+        course_context = await asyncio.to_thread(
+            rag_service.search_context,
+            request.topic,
+            safety, 
             request.course_id,
             min_diff=diff_range[0],
             max_diff=diff_range[1]
@@ -459,11 +633,11 @@ async def generate_quiz(request: QuizRequest):
         return generate_math_question(request.difficulty)
 
     try:
-        from google import genai
         from google.genai import types
         from ai_utils import generate_content_with_fallback
+        from genai_clients import genai_clients
         
-        client = genai.Client(api_key=api_key)
+        client = genai_clients.get(api_key)
         
         # STRICTER PROMPT
         # STRICTER PROMPT - CONTEXT SCOPING
@@ -540,11 +714,13 @@ class GenerateCourseRequest(BaseModel):
     module_count: int = 8
     intensity: str = "standard"
     user_id: str = "anonymous_hero" # Added user_id
+    bypass_cache: bool = False
 
-@app.post("/generate-course")
+@app.post("/generate-course", dependencies=[requires("economy", "rag", "courses")])
 async def generate_course(request: GenerateCourseRequest):
     """
     Generates a full course structure based on ingested materials for the given course_id.
+    Runs as a background job: returns a job_id to poll at /jobs/{job_id}.
     """
     # Economy Check: Cost based on Detail Level (Intensity) and Module Count
     # Base Cost: 2 Obols
@@ -557,36 +733,37 @@ async def generate_course(request: GenerateCourseRequest):
     
     cost = (2 * intensity_mult) + (request.module_count * 0.1)
     
-    if not economy.spend(request.user_id, cost, "Course Genesis"):
+    if not await asyncio.to_thread(economy.spend, request.user_id, cost, "Course Genesis"):
         raise HTTPException(status_code=402, detail=f"Insufficient Obols for Genesis. Required: {cost:.1f}")
 
-    try:
+    async def run_generate_course(job):
         # Retrieve context from all ingested files for this course
         # We search for the course title/description to get relevant context
-        context = rag_service.search_context(f"{request.title} {request.description}", "SAFETY_TOKEN_BYPASSED_INTERNAL", request.course_id)
+        job.progress(0.1, "Retrieving course materials")
+        context = await asyncio.to_thread(rag_service.search_context, f"{request.title} {request.description}", INTERNAL_BYPASS, request.course_id)
         
         # If no context found, fallback to basic generation or error?
         # We'll proceed with whatever context we have (even empty)
         
+        job.progress(0.3, "Generating course structure")
         structure = await course_generator.generate_structure(
             request.title, 
             context or f"Course Title: {request.title}. Description: {request.description}",
             module_count=request.module_count,
-            intensity=request.intensity
+            intensity=request.intensity,
+            bypass_cache=request.bypass_cache
         )
         
         # Apply module count constraint (naive slicing or prompt engineering would be better, but this is a start)
         # If structure has more/less modules, the LLM usually tries to follow instructions if passed. 
-        # But `generate_structure` signature in `course_generator.py` might not accept params.
-        # checking course_generator.py would be wise, but for now assuming it does standard gen.
         
         COURSES_DB[request.course_id] = structure
-        persistence_service.save_courses(COURSES_DB)
+        persistence_service.save_course(request.course_id, structure)
         
         return structure
-    except Exception as e:
-        print(f"Error generating course: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+    job = job_queue.submit("generate-course", run_generate_course, course_id=request.course_id, user_id=request.user_id)
+    return JSONResponse(status_code=202, content={"status": "accepted", "job_id": job["id"], "cost_incurred": cost})
 
 @app.post("/analyze-telemetry")
 async def analyze_telemetry(req: TelemetryRequest):
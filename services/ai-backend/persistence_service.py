@@ -1,17 +1,31 @@
 import json
 import os
-from typing import Dict, Any
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+from durable_store import JournaledStore
 
 DATA_FILE = "courses.json"
 GCP_PROJECT = os.getenv("GCP_PROJECT")
 
 class PersistenceService:
+    """
+    Course persistence with per-course dirty tracking.
+    Writes scale with the edit: a new course writes that course, a lesson auto-save
+    writes that lesson. Locally edits go to the write-ahead journal of a JournaledStore
+    over the courses.json snapshot; in Firestore each course is its own document.
+    """
     def __init__(self, data_file: str = DATA_FILE):
         self.data_file = data_file
+        self.store: Optional[JournaledStore] = None
         self.use_firestore = bool(GCP_PROJECT)
         self.firestore_client = None
         self.collection = None
-        
+        self._lock = threading.Lock()
+        self._courses: Dict[str, Any] = {}
+        self._fingerprints: Dict[str, str] = {}
+
         if self.use_firestore:
             try:
                 from google.cloud import firestore
@@ -22,16 +36,16 @@ class PersistenceService:
             except Exception as e:
                 print(f"PersistenceService Error initializing Firestore: {e}. Falling back to local.")
                 self.use_firestore = False
-        
+
         if not self.use_firestore:
-            self.ensure_file_exists()
+            self.store = JournaledStore(self.data_file, indent=4)
 
-    def ensure_file_exists(self):
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, 'w') as f:
-                json.dump({}, f)
+    @staticmethod
+    def _fingerprint(data: Any) -> str:
+        return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
 
     def load_courses(self) -> Dict[str, Any]:
+        """Loads every course. The returned dict is the one later saves are tracked against."""
         if self.use_firestore and self.collection:
             try:
                 courses = {}
@@ -40,39 +54,60 @@ class PersistenceService:
                 for doc in docs:
                     courses[doc.id] = doc.to_dict()
                 print(f"PersistenceService: Loaded {len(courses)} courses from Firestore.")
-                return courses
             except Exception as e:
                 print(f"PersistenceService: Error loading from Firestore: {e}")
-                return {}
+                courses = {}
         else:
-            try:
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return {}
+            courses = self.store.data
 
-    def save_courses(self, courses_db: Dict[str, Any]):
-        if self.use_firestore and self.firestore_client and self.collection:
+        self._courses = courses
+        self._fingerprints = {cid: self._fingerprint(data) for cid, data in courses.items()}
+        return courses
+
+    # --- Writes ---
+    def save_course(self, course_id: str, data: Dict[str, Any]):
+        """Persists one whole course (new or regenerated structure)."""
+        with self._lock:
+            self._courses[course_id] = data
+            fingerprint = self._fingerprint(data)
+            if self._fingerprints.get(course_id) == fingerprint:
+                return
             try:
-                batch = self.firestore_client.batch()
-                count = 0
-                for course_id, data in courses_db.items():
-                    doc_ref = self.collection.document(course_id)
-                    batch.set(doc_ref, data)
-                    count += 1
-                    if count >= 400:
-                        batch.commit()
-                        batch = self.firestore_client.batch()
-                        count = 0
-                if count > 0:
-                    batch.commit()
-                # Note: This logic does NOT delete courses removed from memory. 
-                # Assuming append-only/update logic for now.
+                if self.use_firestore and self.collection:
+                    self.collection.document(course_id).set(data)
+                else:
+                    self.store.set(course_id, data)
+                self._fingerprints[course_id] = fingerprint
             except Exception as e:
-                print(f"PersistenceService: Error saving to Firestore: {e}")
-        else:
+                print(f"PersistenceService: Error saving course {course_id}: {e}")
+
+    def save_lesson_content(self, course_id: str, module_index: int, lesson_index: int, content: Any):
+        """Persists the content of a single lesson already set on the in-memory course."""
+        with self._lock:
+            course = self._courses.get(course_id)
+            if course is None:
+                return
             try:
-                with open(self.data_file, 'w') as f:
-                    json.dump(courses_db, f, indent=4)
+                if self.use_firestore and self.collection:
+                    # Firestore field paths cannot address array elements, so the
+                    # course's modules field is updated on its own document.
+                    self.collection.document(course_id).update({"modules": course["modules"]})
+                else:
+                    self.store.set_path([course_id, "modules", module_index, "lessons", lesson_index, "content"], content)
+                self._fingerprints[course_id] = self._fingerprint(course)
             except Exception as e:
-                print(f"Error saving courses: {e}")
+                print(f"PersistenceService: Error saving lesson {course_id} M{module_index}:L{lesson_index}: {e}")
+
+    def save_courses(self, courses_db: Dict[str, Any]):
+        """Persists every course that changed since it was last loaded or saved."""
+        dirty = [cid for cid, data in courses_db.items() if self._fingerprints.get(cid) != self._fingerprint(data)]
+        for course_id in dirty:
+            self.save_course(course_id, courses_db[course_id])
+        # Note: This logic does NOT delete courses removed from memory.
+        # Assuming append-only/update logic for now.
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"backend": "firestore" if self.use_firestore else "local", "courses": len(self._courses)}
+        if self.store is not None:
+            stats.update(self.store.stats())
+        return stats
@@ -1,17 +1,30 @@
 from fastapi import UploadFile
 import shutil
 import os
+import asyncio
+import hashlib
 
 import json
+from search_index import query_terms
+from vector_store import ShardedVectorStore
+from dense_index import ChunkEmbedder
+from safety_context import INTERNAL_BYPASS, authorize
 
 # Configurable Persistence
 # Configurable Persistence
 DATA_DIR = os.getenv("DATA_DIR", "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-VECTOR_STORE_PATH = os.path.join(DATA_DIR, "vector_store.json")
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 
+# Streaming ingest: read size per step, and GCS resumable upload chunk (multiple of 256 KiB)
+INGEST_BLOCK_SIZE = 1024 * 1024
+GCS_UPLOAD_CHUNK_SIZE = 8 * 256 * 1024
+
+# Hybrid retrieval: candidates per ranker, fused with Reciprocal Rank Fusion
+RETRIEVAL_CANDIDATES = 20
+RRF_K = 60
+
 class RAGService:
     def __init__(self):
         self.upload_dir = os.path.join(DATA_DIR, "uploaded_materials")
@@ -27,81 +40,69 @@ class RAGService:
             except Exception as e:
                 print(f"RAGService GCS Error: {e}. Fallback to local.")
         
-        self.vector_store = self._load_store()
-
-    def _load_store(self):
-        if self.gcs_bucket:
-            try:
-                blob = self.gcs_bucket.blob("vector_store.json")
-                if blob.exists():
-                    data = blob.download_as_text()
-                    return json.loads(data)
-                return {}
-            except Exception as e:
-                print(f"Failed to load vector store from GCS: {e}")
-                return {}
-        else:
-            if os.path.exists(VECTOR_STORE_PATH):
-                try:
-                    with open(VECTOR_STORE_PATH, "r") as f:
-                        return json.load(f)
-                except Exception as e:
-                    print(f"Failed to load vector store: {e}")
-            return {}
-
-    def _save_store(self):
-        if self.gcs_bucket:
-            try:
-                blob = self.gcs_bucket.blob("vector_store.json")
-                blob.upload_from_string(json.dumps(self.vector_store), content_type="application/json")
-            except Exception as e:
-                print(f"Failed to save vector store to GCS: {e}")
-        else:
-            try:
-                with open(VECTOR_STORE_PATH, "w") as f:
-                    json.dump(self.vector_store, f)
-            except Exception as e:
-                print(f"Failed to save vector store: {e}")
+        # Per-course shards, loaded lazily on first query (see vector_store.py)
+        self.store = ShardedVectorStore(DATA_DIR, gcs_bucket=self.gcs_bucket)
+        self.embedder = ChunkEmbedder()
 
     async def ingest_file(self, file: UploadFile, course_id: str):
-        content = await file.read()
-        
-        # Cloud Storage Upload
-        if self.gcs_bucket:
-             blob = self.gcs_bucket.blob(f"uploaded_materials/{file.filename}")
-             blob.upload_from_string(content)
-             print(f"Uploaded {file.filename} to GCS")
-             
-        # Local Fallback (always save locally too for parsing library compatibility if needed, 
-        # but Cloud Run is ephemeral, so local files vanish. 
-        # HOWEVER, 'course_generator.parse_document' reads 'file_path'.
-        # Python 'open()' works on local files.
-        # So we MUST save to local temp disk (/tmp usually, or app dir).
-        # Cloud Run allows writing to file system (in-memory overlay).
+        # Stream the upload in fixed-size blocks to local disk and GCS in one pass,
+        # hashing as we go, so memory per upload is one block regardless of file size.
+        # 'course_generator.parse_document' reads the local copy, so it is always written
+        # (Cloud Run allows writing to the in-memory overlay filesystem).
         file_path = os.path.join(self.upload_dir, file.filename)
-        with open(file_path, "wb") as f:
-            f.write(content)
-            
+        digest = hashlib.sha256()
+        size = 0
+
+        gcs_writer = None
+        if self.gcs_bucket:
+            blob = self.gcs_bucket.blob(f"uploaded_materials/{file.filename}")
+            gcs_writer = blob.open("wb", chunk_size=GCS_UPLOAD_CHUNK_SIZE)
+
+        try:
+            with open(file_path, "wb") as f:
+                while True:
+                    block = await file.read(INGEST_BLOCK_SIZE)
+                    if not block:
+                        break
+                    size += len(block)
+                    digest.update(block)
+                    await asyncio.to_thread(self._write_block, block, f, gcs_writer)
+        finally:
+            if gcs_writer:
+                await asyncio.to_thread(gcs_writer.close)
+        if gcs_writer:
+            print(f"Uploaded {file.filename} to GCS")
+
+        content_hash = digest.hexdigest()
         doc_id = f"{course_id}_{file.filename}"
-        self.vector_store[doc_id] = {
+        self.store.put_document(course_id, doc_id, {
             "filename": file.filename,
             "course_id": course_id,
             "status": "indexed",
-            "mock_embedding": [0.1, 0.2, 0.3], # Placeholder 768-dim vector
             "text_content": "", # To be populated by main.py after parsing
+            "size_bytes": size,
+            "sha256": content_hash,
             "chunks": []
-        }
-        self._save_store()
+        })
         
         return {
             "status": "success",
             "document_id": doc_id,
+            "size_bytes": size,
+            "sha256": content_hash,
             "message": f"Successfully ingested {file.filename} for course {course_id}"
         }
 
+    @staticmethod
+    def _write_block(block: bytes, f, gcs_writer):
+        f.write(block)
+        if gcs_writer:
+            gcs_writer.write(block)
+
     def add_text_to_index(self, course_id: str, filename: str, text: str):
         doc_id = f"{course_id}_{filename}"
-        if doc_id in self.vector_store:
+        shard = self.store.get_shard(course_id)
+        if shard and doc_id in shard.documents:
             # Chunk the text
             chunks_text = self._chunk_text(text)
             
@@ -109,14 +110,10 @@ class RAGService:
             # In a real app we'd batch this. For now, we do it per chunk or just simplistic heuristic.
             # User REQUESTED LLM based rating 1-10.
             
-            from google import genai
-            import os
-            
             api_key = os.getenv("GOOGLE_API_KEY")
             rated_chunks = []
             
             if api_key:
-                client = genai.Client(api_key=api_key)
                 # Batch processing to save calls
                 # "Rate these 5 chunks individually 1-10 on math complexity:"
                 # Simple implementation: One call per chunk is too slow. 
@@ -143,10 +140,12 @@ class RAGService:
             else:
                  rated_chunks = [{"text": c, "difficulty": 5} for c in chunks_text]
 
-            self.vector_store[doc_id]["chunks"] = rated_chunks
-            self.vector_store[doc_id]["text_content"] = text
-            self._save_store()
-            print(f"Indexed {len(rated_chunks)} rated chunks for {doc_id}")
+            # Dense embeddings (CPU, batched). None if the embedding model is unavailable.
+            vectors = self.embedder.embed([c["text"] for c in rated_chunks]) if rated_chunks else None
+
+            doc = dict(shard.documents[doc_id], chunks=rated_chunks, text_content=text)
+            self.store.put_document(course_id, doc_id, doc, vectors=vectors)
+            print(f"Indexed {len(rated_chunks)} rated chunks for {doc_id} (embeddings: {vectors is not None})")
 
     def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> list:
         """Splits text into overlapping chunks."""
@@ -162,59 +161,58 @@ class RAGService:
             start += (chunk_size - overlap)
         return chunks
 
+    def context_version(self, course_id: str = None) -> int:
+        """Changes whenever add_text_to_index alters what search_context can return."""
+        return self.store.context_version(course_id)
+
     def search_context(self, query: str, token: object, course_id: str = None, min_diff: int = 1, max_diff: int = 10) -> str:
         """
         Smart Search: Finds relevant chunks filtering by difficulty range [min_diff, max_diff].
+        Chunks are ranked with BM25 over the per-course inverted index, fused with
+        dense cosine similarity when chunk embeddings are available.
         """
         # Internal Bypass Check
-        if token == "SAFETY_TOKEN_BYPASSED_INTERNAL":
+        if token == INTERNAL_BYPASS:
             pass 
+        elif not authorize(token):
+            print(f"RAG ACCESS DENIED: Invalid or Missing SafetyToken")
+            return ""
+
+        terms = query_terms(query)
+        # Without a course, only shards already in memory are searched: loading every
+        # course would evict the working set the LRU is there to keep.
+        if course_id:
+            shard = self.store.get_shard(course_id)
+            shards = [shard] if shard else []
         else:
-            from aergus import aergus
-            if not aergus.validate_token(token):
-                print(f"RAG ACCESS DENIED: Invalid or Missing SafetyToken")
-                return ""
+            shards = self.store.loaded_shards()
+
+        # The embedder loads as a startup component; until then, search is lexical only.
+        query_vector = None
+        if self.embedder.ready:
+            embedded = self.embedder.embed([query])
+            if embedded is not None and len(embedded):
+                query_vector = embedded[0]
 
         results = []
-        
-        # STOP WORDS
-        STOP_WORDS = {"what", "when", "where", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "should", "now"}
-        
-        query_terms = [t.lower() for t in query.replace("?", "").replace(".", "").split()]
-        filtered_terms = [t for t in query_terms if t not in STOP_WORDS and len(t) >= 2]
-        
-        if not filtered_terms:
-            filtered_terms = query_terms
+        for shard in shards:
+            # Ingest jobs update the shard from other threads; hold its lock until the keys are resolved.
+            with shard.lock:
+                lexical = shard.index.search(terms, min_diff, max_diff, limit=RETRIEVAL_CANDIDATES)
+                dense = shard.dense.search(query_vector, min_diff, max_diff, limit=RETRIEVAL_CANDIDATES) if query_vector is not None else []
+                for score, key in self._fuse(lexical, dense)[:3]:
+                    results.append((score, shard.chunk(key)))
 
-        for doc_id, doc in self.vector_store.items():
-            if course_id and doc["course_id"] != course_id:
-                continue
-                
-            chunks = doc.get("chunks", [])
-            for chunk_data in chunks:
-                # Handle legacy string format vs new dict format
-                if isinstance(chunk_data, str):
-                    chunk_text = chunk_data
-                    chunk_diff = 5
-                else:
-                    chunk_text = chunk_data.get("text", "")
-                    chunk_diff = chunk_data.get("difficulty", 5)
-
-                # Filter by Difficulty
-                if not (min_diff <= chunk_diff <= max_diff):
-                    continue
-
-                score = 0
-                lower_chunk = chunk_text.lower()
-                
-                for term in filtered_terms:
-                    count = lower_chunk.count(term)
-                    if count > 0:
-                        score += (count * 2) 
-                
-                if score > 0:
-                    results.append((score, f"From {doc['filename']} (Diff {chunk_diff}):\n{chunk_text}"))
-                    
         results.sort(key=lambda x: x[0], reverse=True)
-        top_chunks = [r[1] for r in results[:3]]
+        top_chunks = [f"From {filename} (Diff {diff}):\n{text}" for _, (filename, diff, text) in results[:3]]
         return "\n\n---\n\n".join(top_chunks) if top_chunks else ""
+
+    def _fuse(self, lexical: list, dense: list) -> list:
+        """Reciprocal Rank Fusion of (score, key) rankings. Lexical order is kept if there is no dense ranking."""
+        if not dense:
+            return lexical
+        fused = {}
+        for ranking in (lexical, dense):
+            for rank, (_, key) in enumerate(ranking):
+                fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(((score, key) for key, score in fused.items()), key=lambda x: x[0], reverse=True)
@@ -0,0 +1,53 @@
+from typing import Dict, Optional, Tuple
+
+from verdict_cache import normalize_message
+
+# Request-scoped Aergus state.
+# main.py creates one SafetyContext per request through a FastAPI dependency. Route code
+# scans through it, so the same content is only scanned once per request. Downstream
+# services (RAG search, tutor chat) receive the context itself instead of a bare
+# SafetyToken. A cleared context is trusted as-is: its token was minted by Aergus in
+# this process during this request, so it is not re-hashed.
+
+INTERNAL_BYPASS = "SAFETY_TOKEN_BYPASSED_INTERNAL"
+
+ScanResult = Tuple[bool, Optional[object], str]  # (passed, SafetyToken | None, reason)
+
+
+class SafetyContext:
+    def __init__(self, aergus):
+        self._aergus = aergus
+        self._scans: Dict[Tuple[str, str], ScanResult] = {}
+        self.token = None  # SafetyToken from the latest passing scan
+        self.blocked_reason: Optional[str] = None
+        self.scans = 0
+        self.deduplicated = 0
+
+    async def scan(self, text: str, user_id: str) -> ScanResult:
+        key = (user_id, normalize_message(text))
+        result = self._scans.get(key)
+        if result is not None:
+            self.deduplicated += 1
+            return result
+        result = await self._aergus.scan_message(text, user_id)
+        self.scans += 1
+        self._scans[key] = result
+        passed, token, reason = result
+        if passed:
+            self.token = token
+        elif self.blocked_reason is None:
+            self.blocked_reason = reason
+        return result
+
+    @property
+    def cleared(self) -> bool:
+        """At least one scan passed and nothing in this request was blocked."""
+        return self.token is not None and self.blocked_reason is None
+
+
+def authorize(token: object) -> bool:
+    """Gate for services that require Aergus clearance: a SafetyContext or a signed SafetyToken."""
+    if isinstance(token, SafetyContext):
+        return token.cleared
+    from aergus import aergus
+    return aergus.validate_token(token)
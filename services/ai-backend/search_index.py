@@ -0,0 +1,101 @@
+import math
+import re
+import heapq
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Lexical retrieval for RAGService.
+# One BM25Index per course: postings map each token to the chunks containing it
+# (with term frequency), so a query only scores chunks that share a term with it.
+
+STOP_WORDS = {"what", "when", "where", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "should", "now"}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    """Tokenizes a query, dropping stop words unless nothing else is left."""
+    terms = tokenize(query)
+    filtered = [t for t in terms if t not in STOP_WORDS and len(t) >= 2]
+    return filtered or terms
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # chunk_id -> (doc_id, position, difficulty, text, length)
+        self.chunks: Dict[int, Tuple[str, int, int, str, int]] = {}
+        self.doc_chunks: Dict[str, List[int]] = {}
+        self.total_length = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add_document(self, doc_id: str, chunks: list):
+        """Indexes a document's chunks, replacing any previous version of it."""
+        self.remove_document(doc_id)
+        ids = []
+        for position, chunk_data in enumerate(chunks):
+            # Handle legacy string format vs new dict format
+            if isinstance(chunk_data, str):
+                text, difficulty = chunk_data, 5
+            else:
+                text, difficulty = chunk_data.get("text", ""), chunk_data.get("difficulty", 5)
+
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            chunk_id = self._next_id
+            self._next_id += 1
+
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            self.chunks[chunk_id] = (doc_id, position, difficulty, text, length)
+            self.total_length += length
+            ids.append(chunk_id)
+        self.doc_chunks[doc_id] = ids
+
+    def remove_document(self, doc_id: str):
+        for chunk_id in self.doc_chunks.pop(doc_id, []):
+            _, _, _, text, length = self.chunks.pop(chunk_id)
+            self.total_length -= length
+            for term in set(tokenize(text)):
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                posting.pop(chunk_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, terms: List[str], min_diff: int = 1, max_diff: int = 10, limit: int = 3) -> List[Tuple[float, Tuple[str, int]]]:
+        """
+        Scores every chunk that contains at least one query term.
+        Returns up to `limit` (score, (doc_id, chunk position)) pairs, best first.
+        """
+        n = len(self.chunks)
+        if not n or not terms:
+            return []
+        avg_len = self.total_length / n or 1.0
+
+        scores: Dict[int, float] = {}
+        for term, qtf in Counter(terms).items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                diff = self.chunks[chunk_id][2]
+                if not (min_diff <= diff <= max_diff):
+                    continue
+                length = self.chunks[chunk_id][4]
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + qtf * idf * norm
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+        return [(score, (self.chunks[cid][0], self.chunks[cid][1])) for cid, score in best]
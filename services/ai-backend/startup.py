@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import asyncio
+import builtins
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Startup orchestration for the AI backend.
+# Heavy components (toxic-bert, the RAG store, course catalog, economy ledger) load in
+# background threads once the app is up, so the process can answer liveness probes
+# right away. Routes declare which components they need and wait for them up to
+# STARTUP_WAIT_TIMEOUT_S before answering 503. /readyz turns green once every required
+# component is loaded; optional ones (required=False) only show up in the snapshot.
+
+STARTUP_WAIT_TIMEOUT_S = float(os.getenv("STARTUP_WAIT_TIMEOUT_S", "30"))
+# Opt-in: wraps builtins.__import__ until startup settles, or STARTUP_PROFILE_MAX_S at the latest.
+STARTUP_PROFILE_IMPORTS = os.getenv("STARTUP_PROFILE_IMPORTS", "0") == "1"
+STARTUP_PROFILE_MAX_S = float(os.getenv("STARTUP_PROFILE_MAX_S", "300"))
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ComponentUnavailable(Exception):
+    def __init__(self, name: str, state: str, detail: str = ""):
+        super().__init__(f"Component '{name}' is {state}{': ' + detail if detail else ''}")
+        self.name = name
+        self.state = state
+
+
+class Component:
+    def __init__(self, name: str, loader: Callable[[], object], depends_on: tuple = (), required: bool = True):
+        self.name = name
+        self.loader = loader
+        self.depends_on = depends_on
+        self.required = required
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.load_s: Optional[float] = None
+        self.value = None
+        self._done: Optional[asyncio.Event] = None  # created on the serving loop in start()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "load_s": round(self.load_s, 3) if self.load_s is not None else None,
+            "loading_for_s": round(time.time() - self.started_at, 1) if self.state == LOADING else None,
+            "error": self.error,
+        }
+
+
+class ImportProfiler:
+    """Cumulative wall time of each module's first import (like `python -X importtime`, top-level names only)."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._original = None
+        self._local = threading.local()
+
+    def start(self):
+        if self._original is not None:
+            return
+        self._original = builtins.__import__
+        original = self._original
+        profiler = self
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules or getattr(profiler._local, "active", False):
+                return original(name, globals, locals, fromlist, level)
+            # Only the outermost new import on each thread is timed; nested imports count toward it.
+            profiler._local.active = True
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                profiler._local.active = False
+                root = name.split(".")[0]
+                profiler.timings[root] = profiler.timings.get(root, 0.0) + time.perf_counter() - start
+
+        builtins.__import__ = timed_import
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def report(self, top: int = 15) -> List[dict]:
+        ranked = sorted(self.timings.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        return [{"module": name, "ms": round(1000 * seconds, 1)} for name, seconds in ranked]
+
+
+class StartupOrchestrator:
+    def __init__(self):
+        self.components: Dict[str, Component] = {}
+        self.process_started_at = time.time()
+        self.ready_at: Optional[float] = None
+        self.import_profiler = ImportProfiler()
+        if STARTUP_PROFILE_IMPORTS:
+            self.import_profiler.start()
+
+    def register(self, name: str, loader: Callable[[], object], depends_on: tuple = (), required: bool = True):
+        self.components[name] = Component(name, loader, depends_on, required)
+
+    async def start(self):
+        """Kicks off every component load in the background; returns immediately."""
+        for component in self.components.values():
+            component._done = asyncio.Event()
+        # Never leave imports wrapped for the life of the process, even if a component hangs.
+        asyncio.get_running_loop().call_later(STARTUP_PROFILE_MAX_S, self.import_profiler.stop)
+        for component in self.components.values():
+            asyncio.get_running_loop().create_task(self._load(component))
+
+    async def _load(self, component: Component):
+        for dependency in component.depends_on:
+            try:
+                await self.wait(dependency, timeout=None)
+            except ComponentUnavailable as e:
+                component.state = FAILED
+                component.error = f"dependency failed: {e}"
+                component._done.set()
+                self._check_complete()
+                return
+        component.state = LOADING
+        component.started_at = time.time()
+        start = time.perf_counter()
+        try:
+            component.value = await asyncio.to_thread(component.loader)
+            component.state = READY
+            print(f"Startup: {component.name} ready in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            component.state = FAILED
+            component.error = str(e)
+            print(f"Startup: {component.name} FAILED after {time.perf_counter() - start:.2f}s: {e}")
+        component.load_s = time.perf_counter() - start
+        component._done.set()
+        self._check_complete()
+
+    def _check_complete(self):
+        if self.ready_at is None and all(c.state in (READY, FAILED) for c in self.components.values()):
+            self.ready_at = time.time()
+            self.import_profiler.stop()
+            print(f"Startup: all components settled {self.ready_at - self.process_started_at:.2f}s after process start.")
+            slowest = ", ".join(f"{r['module']} {r['ms']:.0f}ms" for r in self.import_profiler.report(5))
+            if slowest:
+                print(f"Startup: slowest imports: {slowest}")
+
+    async def wait(self, name: str, timeout: Optional[float] = STARTUP_WAIT_TIMEOUT_S):
+        """Returns the loaded component, waiting up to `timeout` seconds for it."""
+        component = self.components[name]
+        if component.state == READY:
+            return component.value
+        if component._done is None:
+            raise ComponentUnavailable(name, component.state, "startup has not begun")
+        if not component._done.is_set():
+            try:
+                await asyncio.wait_for(component._done.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise ComponentUnavailable(name, component.state, f"not ready after {timeout:g}s")
+        if component.state != READY:
+            raise ComponentUnavailable(name, component.state, component.error or "")
+        return component.value
+
+    def is_ready(self, name: str) -> bool:
+        component = self.components.get(name)
+        return component is not None and component.state == READY
+
+    def ready(self) -> bool:
+        return all(c.state == READY for c in self.components.values() if c.required)
+
+    def snapshot(self) -> dict:
+        return {name: c.snapshot() for name, c in self.components.items()}
+
+    def report(self) -> dict:
+        return {
+            "uptime_s": round(time.time() - self.process_started_at, 1),
+            "ready_after_s": round(self.ready_at - self.process_started_at, 2) if self.ready_at else None,
+            "components": self.snapshot(),
+            "slowest_imports": self.import_profiler.report(),
+        }
+
+
+orchestrator = StartupOrchestrator()
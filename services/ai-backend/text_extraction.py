@@ -0,0 +1,118 @@
+import os
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from pypdf import PdfReader
+
+# PDF text extraction off the event loop.
+# Page ranges are split across a process pool (pypdf is pure Python, so threads would
+# serialize on the GIL) and joined once at the end. Extracted text is cached on disk by
+# the file's SHA-256, so re-uploading a textbook or adding it to a second course skips parsing.
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TEXT_CACHE_DIR = os.path.join(DATA_DIR, "text_cache")
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _page_count(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Runs in a worker process. Each worker opens its own reader."""
+    reader = PdfReader(file_path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+class TextExtractor:
+    def __init__(self, cache_dir: str = TEXT_CACHE_DIR, workers: int = PDF_WORKERS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 'spawn' keeps workers clear of the parent's torch/gRPC threads.
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _cache_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}.txt")
+
+    def _read_cache(self, content_hash: str) -> Optional[str]:
+        path = self._cache_path(content_hash)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        return None
+
+    def _write_cache(self, content_hash: str, text: str):
+        path = self._cache_path(content_hash)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"Text cache write failed: {e}")
+
+    async def extract(self, file_path: str, content_hash: Optional[str] = None) -> str:
+        """Extracts text from a PDF or text file without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        if not file_path.endswith('.pdf'):
+            return await asyncio.to_thread(self._read_text_file, file_path)
+
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(file_sha256, file_path)
+        cached = await asyncio.to_thread(self._read_cache, content_hash)
+        if cached is not None:
+            logger.info(f"Text cache hit for {os.path.basename(file_path)} ({content_hash[:12]})")
+            return cached
+
+        pool = self._get_pool()
+        pages = await loop.run_in_executor(pool, _page_count, file_path)
+        ranges = [(start, min(start + PAGES_PER_TASK, pages)) for start in range(0, pages, PAGES_PER_TASK)]
+        parts = await asyncio.gather(*(loop.run_in_executor(pool, _extract_page_range, file_path, s, e) for s, e in ranges))
+
+        text = "".join(page + "\n" for part in parts for page in part)
+        await asyncio.to_thread(self._write_cache, content_hash, text)
+        return text
+
+    def extract_sync(self, file_path: str) -> str:
+        """In-process extraction for callers without an event loop."""
+        if not file_path.endswith('.pdf'):
+            return self._read_text_file(file_path)
+        content_hash = file_sha256(file_path)
+        cached = self._read_cache(content_hash)
+        if cached is not None:
+            return cached
+        reader = PdfReader(file_path)
+        text = "".join((page.extract_text() or "") + "\n" for page in reader.pages)
+        self._write_cache(content_hash, text)
+        return text
+
+    @staticmethod
+    def _read_text_file(file_path: str) -> str:
+        with open(file_path, 'r') as f:
+            return f.read()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,67 @@
+import os
+
+# Inference backends for the Aergus Tier 2 toxicity model.
+# Every backend returns a transformers text-classification pipeline (top_k=None), so
+# callers and BatchedClassifier see the same interface whichever one is loaded.
+#
+#   torch  full-precision PyTorch on CPU (the original setup)
+#   int8   PyTorch with dynamic int8 quantization of the Linear layers
+#   onnx   ONNX graph on onnxruntime's CPU provider (needs `optimum[onnxruntime]`).
+#          The export is cached under DATA_DIR/models.
+#
+# An unavailable backend falls back to torch. Use tests/bench_toxicity_backends.py to
+# check label-score parity against torch and to compare latency, throughput and RSS.
+
+AERGUS_MODEL = os.getenv("AERGUS_MODEL", "unitary/toxic-bert")
+AERGUS_BACKEND = os.getenv("AERGUS_BACKEND", "torch")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+ONNX_CACHE_DIR = os.path.join(DATA_DIR, "models")
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def _load_torch(model_name: str):
+    from transformers import pipeline
+    return pipeline("text-classification", model=model_name, top_k=None, device=-1)
+
+
+def _load_int8(model_name: str):
+    import torch
+    from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None, device=-1)
+
+
+def _load_onnx(model_name: str):
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from transformers import pipeline, AutoTokenizer
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--") + "-onnx")
+    if os.path.exists(os.path.join(export_dir, "model.onnx")):
+        model = ORTModelForSequenceClassification.from_pretrained(export_dir, provider="CPUExecutionProvider")
+        tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    else:
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True, provider="CPUExecutionProvider")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        os.makedirs(export_dir, exist_ok=True)
+        model.save_pretrained(export_dir)
+        tokenizer.save_pretrained(export_dir)
+    return pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None)
+
+
+_LOADERS = {"torch": _load_torch, "int8": _load_int8, "onnx": _load_onnx}
+
+
+def load_classifier(backend: str = AERGUS_BACKEND, model_name: str = AERGUS_MODEL):
+    """Returns (pipeline, backend actually loaded). Raises only if even the torch backend fails."""
+    if backend not in _LOADERS:
+        print(f"AERGUS: Unknown Tier 2 backend '{backend}', using torch.")
+        backend = "torch"
+    if backend != "torch":
+        try:
+            return _LOADERS[backend](model_name), backend
+        except Exception as e:
+            print(f"AERGUS: Tier 2 backend '{backend}' unavailable ({e}). Falling back to torch.")
+    return _load_torch(model_name), "torch"
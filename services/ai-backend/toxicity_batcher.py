@@ -0,0 +1,109 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+# Micro-batching front end for the Aergus Tier 2 classifier.
+# Requests queue up on the event loop. A collector takes up to TIER2_MAX_BATCH texts, waiting
+# at most TIER2_MAX_WAIT_MS after the first one. It runs them as one forward pass on a
+# dedicated inference thread and fans the scores back out to the waiting requests. The
+# event loop never runs BERT itself, and concurrent scans share forward passes instead
+# of queueing behind each other.
+
+TIER2_MAX_BATCH = int(os.getenv("TIER2_MAX_BATCH", "16"))
+TIER2_MAX_WAIT_MS = float(os.getenv("TIER2_MAX_WAIT_MS", "8"))
+# Intra-op threads for the inference thread; defaults to the pod's CPU allowance.
+TIER2_TORCH_THREADS = int(os.getenv("TIER2_TORCH_THREADS", str(max(1, min(4, os.cpu_count() or 1)))))
+
+
+def _init_inference_thread(threads: int):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception as e:
+        print(f"AERGUS: Could not set torch threads ({e}).")
+
+
+class BatchedClassifier:
+    def __init__(self, classifier, max_batch: int = TIER2_MAX_BATCH, max_wait_ms: float = TIER2_MAX_WAIT_MS, threads: int = TIER2_TORCH_THREADS):
+        self.classifier = classifier
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tier2", initializer=_init_inference_thread, initargs=(threads,))
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop = None
+        self._collector: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_infer_s = 0.0
+
+    def _ensure_collector(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._collector = loop.create_task(self._collect())
+
+    async def classify(self, text: str) -> List[dict]:
+        """Scores one text; equivalent to classifier(text)[0] with top_k=None."""
+        self._ensure_collector()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._infer, texts)
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _infer(self, texts: List[str]) -> list:
+        """Runs on the inference thread. A failing batch is retried per text so one bad input only fails itself."""
+        start = time.perf_counter()
+        try:
+            results = self.classifier(texts, batch_size=len(texts), truncation=True)
+        except Exception:
+            results = []
+            for text in texts:
+                try:
+                    results.append(self.classifier([text], truncation=True)[0])
+                except Exception as e:
+                    results.append(e)
+        self.total_infer_s += time.perf_counter() - start
+        self.batches += 1
+        self.items += len(texts)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "avg_infer_ms": round(1000 * self.total_infer_s / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
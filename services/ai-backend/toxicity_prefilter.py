@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# First stage of the Aergus Tier 2 cascade: a hashed n-gram logistic regression.
+# It predicts whether toxic-bert would escalate a message (block it or send it to Tier 3).
+# Messages it scores below the skip threshold are cleared without a BERT forward pass;
+# everything else goes to BERT as before. Scoring is a few dozen weight lookups in NumPy.
+#
+# The model is trained offline from logged Tier 2 scores. The skip threshold is chosen on
+# held-out data so that at least AERGUS_PREFILTER_RECALL of BERT's positives still
+# escalate. AERGUS_PREFILTER_AUDIT_RATE of skipped messages are sent to BERT anyway,
+# which measures the live miss rate (see stats()).
+#
+#   Log:    AERGUS_TIER2_LOG_RATE=1 writes (text, scores) to DATA_DIR/tier2_scores.jsonl
+#   Train:  python tests/replay_toxicity_prefilter.py train data/tier2_scores.jsonl
+#   Replay: python tests/replay_toxicity_prefilter.py replay data/tier2_scores.jsonl
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+PREFILTER_MODEL_PATH = os.getenv("AERGUS_PREFILTER_MODEL", os.path.join(DATA_DIR, "models", "aergus_prefilter.npz"))
+PREFILTER_ENABLED = os.getenv("AERGUS_PREFILTER", "1") == "1"
+PREFILTER_RECALL = float(os.getenv("AERGUS_PREFILTER_RECALL", "0.995"))
+PREFILTER_AUDIT_RATE = float(os.getenv("AERGUS_PREFILTER_AUDIT_RATE", "0.02"))
+TIER2_LOG_PATH = os.getenv("AERGUS_TIER2_LOG_PATH", os.path.join(DATA_DIR, "tier2_scores.jsonl"))
+# Fraction of Tier 2 inferences written to the training log; 0 disables logging (message text is stored).
+TIER2_LOG_RATE = float(os.getenv("AERGUS_TIER2_LOG_RATE", "0"))
+TIER2_LOG_MAX_MB = float(os.getenv("AERGUS_TIER2_LOG_MAX_MB", "256"))
+
+DIM_BITS = 18
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def tier2_positive(scores: Dict[str, float]) -> bool:
+    """True if Aergus would act on these Tier 2 scores (block or escalate to Tier 3).
+    Mirrors the thresholds in Aergus._classify, using the stricter minor threshold for 'toxic'."""
+    return (
+        scores.get("threat", 0) > 0.8 or scores.get("identity_hate", 0) > 0.8 or scores.get("severe_toxic", 0) > 0.8
+        or scores.get("toxic", 0) > 0.6 or scores.get("obscene", 0) > 0.8 or scores.get("insult", 0) > 0.7
+    )
+
+
+def featurize(text: str, dim_bits: int = DIM_BITS) -> np.ndarray:
+    """Hashed word uni/bigrams and character trigrams (which catch obfuscations like 'f*ck')."""
+    normalized = " ".join(text.lower().split())
+    words = _WORD.findall(normalized)
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {normalized} "
+    grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    mask = (1 << dim_bits) - 1
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) & mask for g in grams), dtype=np.int64, count=len(grams)))
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class PrefilterModel:
+    def __init__(self, weights: np.ndarray, bias: float, threshold: float, meta: Optional[dict] = None):
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+        self.meta = meta or {}
+        self.dim_bits = int(np.log2(len(weights)))
+
+    def score(self, text: str) -> float:
+        """Estimated probability that BERT escalates `text`."""
+        idx = featurize(text, self.dim_bits)
+        if not len(idx):
+            return float(_sigmoid(self.bias))
+        return float(_sigmoid(self.weights[idx].sum() / np.sqrt(len(idx)) + self.bias))
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp, weights=self.weights, bias=self.bias, threshold=self.threshold, meta=json.dumps(self.meta))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PrefilterModel":
+        with np.load(path) as f:
+            return cls(f["weights"], float(f["bias"]), float(f["threshold"]), json.loads(str(f["meta"])))
+
+
+def read_log(path: str) -> List[Tuple[str, bool]]:
+    """(text, BERT-positive) pairs from a Tier 2 score log."""
+    samples = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                samples.append((record["text"], tier2_positive(record["scores"])))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+    return samples
+
+
+def threshold_for_recall(scores: np.ndarray, labels: np.ndarray, recall: float) -> float:
+    """Highest threshold that keeps at least `recall` of the positives at or above it."""
+    positives = np.sort(scores[labels])
+    if not len(positives):
+        return 0.0
+    allowed_misses = int(np.floor((1.0 - recall) * len(positives)))
+    return float(positives[allowed_misses])
+
+
+def evaluate(model: PrefilterModel, samples: Iterable[Tuple[str, bool]], threshold: Optional[float] = None) -> dict:
+    threshold = model.threshold if threshold is None else threshold
+    total = positives = skipped = missed = 0
+    for text, positive in samples:
+        skip = model.score(text) < threshold
+        total += 1
+        positives += positive
+        skipped += skip
+        missed += skip and positive
+    return {
+        "samples": total,
+        "positives": positives,
+        "threshold": threshold,
+        "skip_rate": skipped / total if total else 0.0,
+        "missed_positive_rate": missed / positives if positives else 0.0,
+        "recall": 1.0 - missed / positives if positives else 1.0,
+        "missed": missed,
+    }
+
+
+def train(samples: List[Tuple[str, bool]], recall: float = PREFILTER_RECALL, epochs: int = 5, lr: float = 0.5,
+          l2: float = 1e-6, holdout: float = 0.2, dim_bits: int = DIM_BITS, seed: int = 0) -> Tuple[PrefilterModel, dict]:
+    """Trains with per-sample AdaGrad on the hashed features and calibrates the threshold on a holdout split."""
+    rng = random.Random(seed)
+    samples = list(samples)
+    rng.shuffle(samples)
+    split = int(len(samples) * (1.0 - holdout))
+    train_set, val_set = samples[:split], samples[split:]
+    features = [featurize(text, dim_bits) for text, _ in train_set]
+    labels = np.array([positive for _, positive in train_set], dtype=bool)
+    n_pos = int(labels.sum())
+    # Positives are rare; weight them up so the model does not learn "always benign".
+    pos_weight = min(50.0, (len(labels) - n_pos) / max(1, n_pos))
+
+    weights = np.zeros(1 << dim_bits, dtype=np.float32)
+    grad_sq = np.full(1 << dim_bits, 1e-8, dtype=np.float32)
+    bias, bias_sq = 0.0, 1e-8
+    order = list(range(len(train_set)))
+    for _ in range(epochs):
+        rng.shuffle(order)
+        for i in order:
+            idx = features[i]
+            if not len(idx):
+                continue
+            scale = 1.0 / np.sqrt(len(idx))
+            p = _sigmoid(weights[idx].sum() * scale + bias)
+            g = (p - labels[i]) * (pos_weight if labels[i] else 1.0)
+            grad = g * scale + l2 * weights[idx]
+            grad_sq[idx] += grad * grad
+            weights[idx] -= lr * grad / np.sqrt(grad_sq[idx])
+            bias_sq += g * g
+            bias -= lr * g / np.sqrt(bias_sq)
+
+    model = PrefilterModel(weights, float(bias), 0.0)
+    calibration = val_set if any(positive for _, positive in val_set) else train_set
+    scores = np.array([model.score(text) for text, _ in calibration])
+    model.threshold = threshold_for_recall(scores, np.array([positive for _, positive in calibration], dtype=bool), recall)
+    report = evaluate(model, val_set) if val_set else evaluate(model, train_set)
+    model.meta = {
+        "trained_at": time.time(),
+        "samples": len(samples),
+        "positives": int(sum(positive for _, positive in samples)),
+        "target_recall": recall,
+        "holdout_recall": report["recall"],
+        "holdout_skip_rate": report["skip_rate"],
+    }
+    return model, report
+
+
+class Prefilter:
+    """Runtime wrapper around the trained model: skip decisions, audit sampling and counters."""
+
+    def __init__(self, model: PrefilterModel, audit_rate: float = PREFILTER_AUDIT_RATE):
+        self.model = model
+        self.audit_rate = audit_rate
+        self.skipped = 0
+        self.escalated = 0
+        self.audits = 0
+        self.audit_misses = 0
+
+    @classmethod
+    def load(cls, path: str = PREFILTER_MODEL_PATH) -> Optional["Prefilter"]:
+        if not PREFILTER_ENABLED or not os.path.exists(path):
+            return None
+        try:
+            prefilter = cls(PrefilterModel.load(path))
+            meta = prefilter.model.meta
+            print(f"AERGUS: Tier 2 prefilter loaded (threshold {prefilter.model.threshold:.4f}, "
+                  f"holdout recall {meta.get('holdout_recall', 0):.3f}, skip rate {meta.get('holdout_skip_rate', 0):.1%}).")
+            return prefilter
+        except Exception as e:
+            print(f"AERGUS: Could not load Tier 2 prefilter from {path}: {e}")
+            return None
+
+    def decide(self, text: str) -> str:
+        """'skip' (cleared without BERT), 'audit' (would skip; BERT checks the call) or 'escalate'."""
+        if self.model.score(text) >= self.model.threshold:
+            self.escalated += 1
+            return "escalate"
+        if self.audit_rate > 0 and random.random() < self.audit_rate:
+            self.audits += 1
+            return "audit"
+        self.skipped += 1
+        return "skip"
+
+    def record_audit(self, bert_positive: bool):
+        if bert_positive:
+            self.audit_misses += 1
+
+    def stats(self) -> dict:
+        decided = self.skipped + self.escalated + self.audits
+        return {
+            "threshold": round(self.model.threshold, 5),
+            "target_recall": self.model.meta.get("target_recall"),
+            "holdout_recall": self.model.meta.get("holdout_recall"),
+            "skip_rate": round((self.skipped + self.audits) / decided, 3) if decided else 0.0,
+            "skipped": self.skipped,
+            "escalated": self.escalated,
+            "audits": self.audits,
+            "audit_miss_rate": round(self.audit_misses / self.audits, 4) if self.audits else None,
+        }
+
+
+class Tier2ScoreLog:
+    """Append-only JSONL of Tier 2 inputs and scores: the prefilter's training data."""
+
+    def __init__(self, path: str = TIER2_LOG_PATH, rate: float = TIER2_LOG_RATE, max_bytes: int = int(TIER2_LOG_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.rate = rate
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def log(self, text: str, scores: Dict[str, float]):
+        if self.rate <= 0 or random.random() >= self.rate:
+            return
+        line = json.dumps({"ts": time.time(), "text": text, "scores": scores}) + "\n"
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    return
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(line)
+                self.written += 1
+            except OSError as e:
+                print(f"AERGUS: Tier 2 score log write failed: {e}")
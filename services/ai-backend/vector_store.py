@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from search_index import BM25Index
+from dense_index import DenseIndex
+from durable_store import atomic_write_json
+
+# Per-course shards of the RAG document store.
+# A small manifest lists the shards; each shard holds one course's documents and is
+# loaded on first use, kept in an LRU bounded by an estimated memory budget, and
+# rewritten on its own when that course changes.
+
+MANIFEST_NAME = "manifest.json"
+SHARD_PREFIX = "vector_store"
+LEGACY_STORE_NAME = "vector_store.json"
+DENSE_PREFIX = "vector_index"
+DEFAULT_MEMORY_BUDGET_MB = int(os.getenv("RAG_SHARD_MEMORY_MB", "128"))
+
+
+def shard_file_name(course_id: str) -> str:
+    """Filesystem/GCS safe, collision free name for a course shard."""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", course_id or "none")[:64]
+    digest = hashlib.sha1((course_id or "").encode()).hexdigest()[:8]
+    return f"{safe}-{digest}.json"
+
+
+class Shard:
+    def __init__(self, course_id: str, documents: Dict[str, dict], dense: DenseIndex):
+        self.course_id = course_id
+        self.documents = documents
+        self.dense = dense
+        # Held by searches for the whole lexical + dense pass and by updates to documents,
+        # index and dense rows, so a search never sees a document half replaced.
+        self.lock = threading.RLock()
+        self.index = BM25Index()
+        for doc_id, doc in documents.items():
+            self.index.add_document(doc_id, doc.get("chunks", []))
+        self.size_bytes = self._estimate_size()
+
+    def set_document(self, doc_id: str, doc: dict):
+        with self.lock:
+            self.documents[doc_id] = doc
+            self.index.add_document(doc_id, doc.get("chunks", []))
+            self.size_bytes = self._estimate_size()
+
+    def chunk(self, key: Tuple[str, int]) -> Tuple[str, int, str]:
+        """Resolves a (doc_id, position) key to (filename, difficulty, text)."""
+        doc_id, position = key
+        doc = self.documents[doc_id]
+        chunk_data = doc["chunks"][position]
+        if isinstance(chunk_data, str):
+            return doc["filename"], 5, chunk_data
+        return doc["filename"], chunk_data.get("difficulty", 5), chunk_data.get("text", "")
+
+    def _estimate_size(self) -> int:
+        # Raw text plus roughly the same again for chunk copies and postings.
+        size = 0
+        for doc in self.documents.values():
+            size += len(doc.get("text_content", ""))
+            for chunk in doc.get("chunks", []):
+                size += 2 * len(chunk if isinstance(chunk, str) else chunk.get("text", ""))
+        return size
+
+
+class ShardedVectorStore:
+    def __init__(self, root_dir: str, gcs_bucket=None, memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.root_dir = os.path.join(root_dir, SHARD_PREFIX)
+        self.dense_dir = os.path.join(root_dir, DENSE_PREFIX)
+        self.legacy_path = os.path.join(root_dir, LEGACY_STORE_NAME)
+        self.gcs_bucket = gcs_bucket
+        self.memory_budget_bytes = memory_budget_bytes
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, Shard]" = OrderedDict()
+        os.makedirs(self.root_dir, exist_ok=True)
+        os.makedirs(self.dense_dir, exist_ok=True)
+
+        self.manifest = self._read_json(MANIFEST_NAME)
+        if self.manifest is None:
+            self.manifest = {"shards": {}}
+            self._migrate_legacy_store()
+
+    # --- Raw I/O (local disk or GCS) ---
+    def _read_json(self, name: str) -> Optional[dict]:
+        try:
+            if self.gcs_bucket:
+                blob = self.gcs_bucket.blob(f"{SHARD_PREFIX}/{name}")
+                if not blob.exists():
+                    return None
+                return json.loads(blob.download_as_text())
+            path = os.path.join(self.root_dir, name)
+            if not os.path.exists(path):
+                return None
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"VectorStore: Failed to read {name}: {e}")
+            return None
+
+    def _write_json(self, name: str, data: dict):
+        try:
+            if self.gcs_bucket:
+                blob = self.gcs_bucket.blob(f"{SHARD_PREFIX}/{name}")
+                blob.upload_from_string(json.dumps(data), content_type="application/json")
+            else:
+                atomic_write_json(os.path.join(self.root_dir, name), data)
+        except Exception as e:
+            print(f"VectorStore: Failed to write {name}: {e}")
+
+    def _migrate_legacy_store(self):
+        """Splits a monolithic vector_store.json into per-course shards (one-off)."""
+        legacy = None
+        try:
+            if self.gcs_bucket:
+                blob = self.gcs_bucket.blob(LEGACY_STORE_NAME)
+                if blob.exists():
+                    legacy = json.loads(blob.download_as_text())
+            elif os.path.exists(self.legacy_path):
+                with open(self.legacy_path, "r") as f:
+                    legacy = json.load(f)
+        except Exception as e:
+            print(f"VectorStore: Failed to read legacy store: {e}")
+        if not legacy:
+            return
+
+        by_course: Dict[str, Dict[str, dict]] = {}
+        for doc_id, doc in legacy.items():
+            doc.pop("mock_embedding", None)
+            by_course.setdefault(doc.get("course_id"), {})[doc_id] = doc
+        for course_id, documents in by_course.items():
+            self._write_shard(course_id, documents)
+        self._write_json(MANIFEST_NAME, self.manifest)
+        print(f"VectorStore: Migrated {len(legacy)} documents into {len(by_course)} course shards.")
+
+    def _write_shard(self, course_id: str, documents: Dict[str, dict]):
+        file_name = shard_file_name(course_id)
+        self._write_json(file_name, {"course_id": course_id, "documents": documents})
+        version = self.manifest["shards"].get(course_id, {}).get("version", 0)
+        self.manifest["shards"][course_id] = {"file": file_name, "documents": sorted(documents), "version": version}
+
+    # --- Dense index files (always memory-mapped from local disk, mirrored to GCS) ---
+    def _open_dense(self, course_id: str) -> DenseIndex:
+        base = os.path.join(self.dense_dir, os.path.splitext(shard_file_name(course_id))[0])
+        if self.gcs_bucket and not os.path.exists(base + ".npy"):
+            try:
+                for suffix in (".npy", ".meta.json"):
+                    blob = self.gcs_bucket.blob(f"{DENSE_PREFIX}/{os.path.basename(base)}{suffix}")
+                    if blob.exists():
+                        blob.download_to_filename(base + suffix)
+            except Exception as e:
+                print(f"VectorStore: Failed to fetch dense index for {course_id}: {e}")
+        return DenseIndex.open(base)
+
+    def _upload_dense(self, dense: DenseIndex):
+        if not self.gcs_bucket:
+            return
+        try:
+            for path in (dense.matrix_path, dense.meta_path):
+                blob = self.gcs_bucket.blob(f"{DENSE_PREFIX}/{os.path.basename(path)}")
+                if os.path.exists(path):
+                    blob.upload_from_filename(path)
+                elif blob.exists():
+                    blob.delete()
+        except Exception as e:
+            print(f"VectorStore: Failed to upload dense index: {e}")
+
+    # --- Shard cache ---
+    def course_ids(self) -> List[str]:
+        with self._lock:
+            return list(self.manifest["shards"].keys())
+
+    def loaded_shards(self) -> List[Shard]:
+        """Shards already in memory, without loading cold ones or touching LRU order."""
+        with self._lock:
+            return list(self._cache.values())
+
+    def get_shard(self, course_id: str, create: bool = False) -> Optional[Shard]:
+        """Returns the course shard, loading it on first use. Marks it most recently used."""
+        with self._lock:
+            shard = self._cache.get(course_id)
+            if shard is not None:
+                self._cache.move_to_end(course_id)
+                return shard
+
+            entry = self.manifest["shards"].get(course_id)
+            if entry is not None:
+                data = self._read_json(entry["file"]) or {}
+                shard = Shard(course_id, data.get("documents", {}), self._open_dense(course_id))
+            elif create:
+                shard = Shard(course_id, {}, self._open_dense(course_id))
+            else:
+                return None
+
+            self._cache[course_id] = shard
+            self._evict()
+            return shard
+
+    def put_document(self, course_id: str, doc_id: str, doc: dict, vectors=None) -> Shard:
+        """
+        Adds or replaces a document and persists only its course shard.
+        `vectors` are the chunk embeddings (one row per chunk); without them any
+        previous embeddings of the document are dropped.
+        """
+        with self._lock:
+            shard = self.get_shard(course_id, create=True)
+            difficulties = [c.get("difficulty", 5) if isinstance(c, dict) else 5 for c in doc.get("chunks", [])]
+            before = len(shard.dense)
+            # Documents and dense rows change together: dense keys resolve through shard.documents.
+            with shard.lock:
+                shard.set_document(doc_id, doc)
+                shard.dense.replace_document(doc_id, vectors, difficulties)
+            self._save_shard(shard)
+            if vectors is not None or len(shard.dense) != before:
+                self._upload_dense(shard.dense)
+            # Bumped once the new chunks are searchable, so answers cached against the
+            # previous version are never served for the new context.
+            self.manifest["shards"][course_id]["version"] += 1
+            self._write_json(MANIFEST_NAME, self.manifest)
+            return shard
+
+    def context_version(self, course_id: Optional[str] = None) -> int:
+        """Monotonic counter of index changes for a course (or across all courses)."""
+        with self._lock:
+            if course_id is not None:
+                return self.manifest["shards"].get(course_id, {}).get("version", 0)
+            return sum(entry.get("version", 0) for entry in self.manifest["shards"].values())
+
+    def _save_shard(self, shard: Shard):
+        # The manifest is written by put_document together with the version bump.
+        self._write_shard(shard.course_id, shard.documents)
+        self._evict()
+
+    def _evict(self):
+        # Always keep the most recently used shard, even if it alone exceeds the budget.
+        total = sum(s.size_bytes for s in self._cache.values())
+        while total > self.memory_budget_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            total -= evicted.size_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shards": len(self.manifest["shards"]),
+                "loaded": list(self._cache.keys()),
+                "loaded_bytes": sum(s.size_bytes for s in self._cache.values()),
+                "budget_bytes": self.memory_budget_bytes,
+            }
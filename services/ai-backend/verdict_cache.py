@@ -0,0 +1,92 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+# LRU/TTL cache of Aergus content verdicts.
+# The key is a hash of the normalized message (lowercased, whitespace collapsed) plus
+# every policy input that can change the outcome: minor flag, age band, institution
+# restriction, the institution's Tier 1 pack and the rules generation. Per-user state
+# (karma and harassment gates) is not part of the verdict. It is checked live on every
+# scan, and a passing hit still gets a freshly signed SafetyToken.
+
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "20000"))
+VERDICT_CACHE_TTL_S = float(os.getenv("VERDICT_CACHE_TTL_S", "3600"))
+# Long messages are almost never repeated; caching them would only churn the LRU.
+VERDICT_CACHE_MAX_CHARS = int(os.getenv("VERDICT_CACHE_MAX_CHARS", "280"))
+
+
+class Verdict(NamedTuple):
+    passed: bool
+    reason: str
+    karma_penalty: int = 0
+    cacheable: bool = True  # False for outcomes of a failure (Tier 2/3 errors, model not loaded)
+
+
+def normalize_message(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class VerdictCache:
+    def __init__(self, max_entries: int = VERDICT_CACHE_MAX_ENTRIES, ttl_s: float = VERDICT_CACHE_TTL_S, max_chars: int = VERDICT_CACHE_MAX_CHARS):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (verdict, created_at, cost_s)
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.saved_s = 0.0
+
+    def make_key(self, text: str, policy: tuple) -> Optional[str]:
+        """None if the message is too long to be worth caching."""
+        normalized = normalize_message(text)
+        if len(normalized) > self.max_chars:
+            return None
+        material = "\x1f".join(str(part) for part in policy) + "\x1e" + normalized
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[Verdict]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl_s:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_s += entry[2]
+            return entry[0]
+
+    def put(self, key: Optional[str], verdict: Verdict, cost_s: float):
+        if key is None:
+            return
+        if not verdict.cacheable:
+            self.uncacheable += 1
+            return
+        with self._lock:
+            self._entries[key] = (verdict, time.time(), cost_s)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "uncacheable": self.uncacheable,
+            "saved_s": round(self.saved_s, 3),
+        }
@@ -6,6 +6,7 @@ import { WizardStepConfig, GenerationConfig } from "./WizardStepConfig";
 import { WizardStepPreview } from "./WizardStepPreview";
 import { CheckCircle2, Loader2, Sparkles, AlertCircle } from "lucide-react";
 import { toast } from "sonner";
+import { waitForJob } from "../utils/jobs";
 
 type CourseWizardProps = {
     onCancel: () => void;
@@ -72,6 +73,9 @@ export function CourseWizard({ onCancel, onFinish, existingData }: CourseWizardP
                                     const err = await res.json().catch(() => ({}));
                                     throw new Error(err.detail || `Failed to ingest ${f.file.name} (Status: ${res.status})`);
                                 }
+                                // Parsing and indexing run as a background job on the backend
+                                const { job_id } = await res.json();
+                                await waitForJob(job_id);
                             } catch (e) {
                                 console.error(e);
                                 throw e;
@@ -100,7 +104,10 @@ export function CourseWizard({ onCancel, onFinish, existingData }: CourseWizardP
                         const err = await genRes.json().catch(() => ({}));
                         throw new Error(err.detail || `Genesis Engine Failure (Status: ${genRes.status})`);
                     }
-                    const structure = await genRes.json();
+                    const { job_id } = await genRes.json();
+                    const structure = await waitForJob(job_id, (job) => {
+                        setProgress(80 + job.progress * 20);
+                    });
 
                     setProgress(100);
 
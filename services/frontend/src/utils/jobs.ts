@@ -0,0 +1,36 @@
+export type JobStatus = "queued" | "running" | "succeeded" | "failed" | "interrupted";
+
+export type Job<T = any> = {
+  id: string;
+  kind: string;
+  status: JobStatus;
+  progress: number;
+  message: string;
+  result: T | null;
+  error: string | null;
+};
+
+/**
+ * Polls a backend job (/api/jobs/:id) until it finishes.
+ * Resolves with the job result, or rejects with the job error.
+ */
+export async function waitForJob<T = any>(
+  jobId: string,
+  onProgress?: (job: Job<T>) => void,
+  intervalMs = 1000
+): Promise<T> {
+  while (true) {
+    const res = await fetch(`/api/jobs/${jobId}`);
+    if (!res.ok) {
+      throw new Error(`Job ${jobId} lookup failed (Status: ${res.status})`);
+    }
+    const job: Job<T> = await res.json();
+    onProgress?.(job);
+
+    if (job.status === "succeeded") return job.result as T;
+    if (job.status === "failed" || job.status === "interrupted") {
+      throw new Error(job.error || `Job ${job.kind} ${job.status}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
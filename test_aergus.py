@@ -2,6 +2,7 @@
 import sys
 import os
 import time
+import asyncio
 
 # Add service directory to path
 sys.path.append(os.path.join(os.getcwd(), 'services/ai-backend'))
@@ -14,6 +15,11 @@ def test_aergus():
     except ImportError as e:
         print(f"FAILED to import Aergus: {e}")
         return
+    # Tier 2 loads lazily (the server does this in the background at startup).
+    try:
+        aergus.load_tier2()
+    except Exception as e:
+        print(f"Tier 2 unavailable, testing Tier 1 only: {e}")
 
     test_cases = [
         ("Hello, I need help with my homework.", "SAFE"),
@@ -26,7 +32,7 @@ def test_aergus():
     for msg, expected in test_cases:
         print(f"\nScanning: '{msg}'")
         start = time.time()
-        passed, token, reason = aergus.scan_message(msg, "test_user")
+        passed, token, reason = asyncio.run(aergus.scan_message(msg, "test_user"))
         duration = time.time() - start
         
         status = "✅ CLEAN" if passed else "🚫 FLAGGED"
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import statistics
+import multiprocessing
+
+# Parity + benchmark harness for the Aergus Tier 2 backends (torch / int8 / onnx).
+# Each backend is loaded in its own process so RSS numbers are not polluted by the others.
+# Usage: python tests/bench_toxicity_backends.py [torch int8 onnx]
+
+sys.path.append(os.path.join(os.getcwd(), 'services/ai-backend'))
+
+CORPUS = [
+    "Hello, I need help with my homework.",
+    "Can you explain the chain rule again?",
+    "What the fuck, that's amazing!",
+    "Fuck you, you useless bot",
+    "You are an idiot and everyone hates you.",
+    "This lesson is shit, honestly.",
+    "I will find you and hurt you.",
+    "Go away, I don't want to talk right now.",
+    "Thanks, that made a lot of sense!",
+    "Why is the mitochondria the powerhouse of the cell?",
+    "Shut up, stupid machine.",
+    "People like you should not exist.",
+    "Damn, I got the quiz wrong again.",
+    "Could you give me another example of a limit?",
+    "You're a worthless piece of garbage.",
+    "I love this course, the arcade is fun.",
+    "Kill all of them, they deserve it.",
+    "What is the difference between mitosis and meiosis?",
+    "Stop being so dumb and answer properly.",
+    "My teacher said the exam is on Friday.",
+]
+BATCH = 16
+LATENCY_RUNS = 3
+THRESHOLD = 0.5  # label "fires" above this score, for agreement counts
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _run_backend(backend: str, queue):
+    from toxicity_backends import load_classifier
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    classifier, loaded = load_classifier(backend)
+    load_s = time.perf_counter() - start
+    if loaded != backend:
+        queue.put({"backend": backend, "error": f"fell back to {loaded}"})
+        return
+
+    classifier(CORPUS[:2])  # warm-up
+
+    latencies = []
+    for _ in range(LATENCY_RUNS):
+        for text in CORPUS:
+            t0 = time.perf_counter()
+            classifier([text], truncation=True)
+            latencies.append(1000 * (time.perf_counter() - t0))
+
+    texts = (CORPUS * ((BATCH * 4) // len(CORPUS) + 1))[:BATCH * 4]
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), BATCH):
+        classifier(texts[i:i + BATCH], batch_size=BATCH, truncation=True)
+    throughput = len(texts) / (time.perf_counter() - t0)
+
+    scores = [{r["label"]: r["score"] for r in result} for result in classifier(CORPUS, batch_size=BATCH, truncation=True)]
+    queue.put({
+        "backend": backend,
+        "load_s": load_s,
+        "rss_mb": _rss_mb(),
+        "rss_delta_mb": _rss_mb() - rss_before,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        "throughput": throughput,
+        "scores": scores,
+    })
+
+
+def run(backend: str) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_backend, args=(backend, queue))
+    proc.start()
+    proc.join()
+    if queue.empty():
+        return {"backend": backend, "error": f"exited with code {proc.exitcode}"}
+    return queue.get()
+
+
+def parity(baseline: list, candidate: list) -> dict:
+    max_diff = 0.0
+    disagreements = 0
+    total = 0
+    for base, cand in zip(baseline, candidate):
+        for label, score in base.items():
+            other = cand.get(label, 0.0)
+            max_diff = max(max_diff, abs(score - other))
+            total += 1
+            if (score > THRESHOLD) != (other > THRESHOLD):
+                disagreements += 1
+    return {"max_abs_diff": max_diff, "label_flips": disagreements, "labels": total}
+
+
+def main():
+    backends = sys.argv[1:] or ["torch", "int8", "onnx"]
+    if "torch" not in backends:
+        backends = ["torch"] + backends
+
+    print("--- AERGUS TIER 2 BACKEND BENCHMARK ---")
+    results = {}
+    for backend in backends:
+        print(f"\nRunning {backend}...")
+        results[backend] = run(backend)
+
+    baseline = results["torch"].get("scores")
+    print(f"\n{'backend':<8} {'load s':>7} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'msg/s':>8}   parity vs torch")
+    for backend, r in results.items():
+        if "error" in r:
+            print(f"{backend:<8} SKIPPED ({r['error']})")
+            continue
+        p = parity(baseline, r["scores"]) if baseline else None
+        parity_str = f"max|d|={p['max_abs_diff']:.4f}, flips={p['label_flips']}/{p['labels']}" if p else "n/a"
+        print(f"{backend:<8} {r['load_s']:>7.1f} {r['rss_mb']:>8.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['throughput']:>8.1f}   {parity_str}")
+
+
+if __name__ == "__main__":
+    main()
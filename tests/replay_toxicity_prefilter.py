@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+
+# Train and replay tool for the Aergus Tier 2 prefilter (services/ai-backend/toxicity_prefilter.py).
+# The corpus is a Tier 2 score log (JSONL of {"text", "scores"}), written by the backend
+# when AERGUS_TIER2_LOG_RATE > 0.
+#
+# Usage:
+#   python tests/replay_toxicity_prefilter.py train  LOG [recall] [model_path]
+#   python tests/replay_toxicity_prefilter.py replay LOG [model_path] [threshold]
+#
+# train fits the model, calibrates the skip threshold for `recall` (default
+# AERGUS_PREFILTER_RECALL) on a 20% holdout, and saves it.
+# replay reports, on any logged corpus, the share of traffic that would skip BERT and
+# the share of BERT positives that would have been skipped. It also sweeps a few
+# recall targets to show the trade-off.
+
+sys.path.append(os.path.join(os.getcwd(), 'services/ai-backend'))
+
+from toxicity_prefilter import (  # noqa: E402
+    PREFILTER_MODEL_PATH, PREFILTER_RECALL, PrefilterModel, evaluate, read_log, threshold_for_recall, train,
+)
+import numpy as np  # noqa: E402
+
+
+def _print_report(title: str, report: dict):
+    print(f"\n--- {title} ---")
+    print(f"samples:              {report['samples']} ({report['positives']} BERT positives)")
+    print(f"threshold:            {report['threshold']:.5f}")
+    print(f"skip rate:            {report['skip_rate']:.1%}  (messages that never reach BERT)")
+    print(f"missed-positive rate: {report['missed_positive_rate']:.2%}  ({report['missed']} positives skipped)")
+    print(f"recall vs BERT:       {report['recall']:.4f}")
+
+
+def cmd_train(log_path: str, recall: float, model_path: str):
+    samples = read_log(log_path)
+    if not samples:
+        print(f"No usable samples in {log_path}")
+        return
+    print(f"Training on {len(samples)} samples from {log_path} (target recall {recall})...")
+    start = time.perf_counter()
+    model, report = train(samples, recall=recall)
+    print(f"Trained in {time.perf_counter() - start:.1f}s")
+    _print_report("HOLDOUT", report)
+    model.save(model_path)
+    print(f"\nSaved model to {model_path}")
+
+
+def cmd_replay(log_path: str, model_path: str, threshold: float = None):
+    samples = read_log(log_path)
+    model = PrefilterModel.load(model_path)
+    _print_report(f"REPLAY {log_path}", evaluate(model, samples, threshold))
+
+    scores = np.array([model.score(text) for text, _ in samples])
+    labels = np.array([positive for _, positive in samples], dtype=bool)
+    print("\nrecall target -> threshold, skip rate, missed-positive rate")
+    for target in (0.95, 0.99, 0.995, 0.999, 1.0):
+        t = threshold_for_recall(scores, labels, target)
+        skipped = scores < t
+        missed = (skipped & labels).sum() / labels.sum() if labels.sum() else 0.0
+        print(f"  {target:<6} -> {t:.5f}, {skipped.mean():.1%}, {missed:.2%}")
+
+    latencies = []
+    for text, _ in samples[:500]:
+        t0 = time.perf_counter()
+        model.score(text)
+        latencies.append(1e6 * (time.perf_counter() - t0))
+    if latencies:
+        print(f"\nprefilter latency: p50 {np.median(latencies):.0f}us, p95 {np.percentile(latencies, 95):.0f}us")
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("train", "replay"):
+        print("usage: python tests/replay_toxicity_prefilter.py train LOG [recall] [model_path]")
+        print("       python tests/replay_toxicity_prefilter.py replay LOG [model_path] [threshold]")
+        sys.exit(1)
+    command, log_path, rest = sys.argv[1], sys.argv[2], sys.argv[3:]
+    if command == "train":
+        recall = float(rest[0]) if rest else PREFILTER_RECALL
+        cmd_train(log_path, recall, rest[1] if len(rest) > 1 else PREFILTER_MODEL_PATH)
+    else:
+        cmd_replay(log_path, rest[0] if rest else PREFILTER_MODEL_PATH, float(rest[1]) if len(rest) > 1 else None)
+
+
+if __name__ == "__main__":
+    main()
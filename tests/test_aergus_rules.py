@@ -0,0 +1,68 @@
+import os
+import re
+import sys
+import random
+
+# Equivalence checks for the compiled Aergus Tier 1 packs: a pack must block exactly
+# the messages that a naive "any rule matches" loop over the same rules would block.
+# Run with `python -m pytest tests/test_aergus_rules.py` or directly with python.
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services', 'ai-backend'))
+
+from aergus_rules import CompiledPack, normalize_phrase  # noqa: E402
+
+ATOMS = [
+    "bomb", "fuck", "you", "kill", "off", "me", "ignore", "prompt",
+    r"f[u*]ck", r"b\w+b", r"\d", r"\d+", r"\w+", r"x?", r"bomb\d",
+    r"(kill|hurt)", r"(?:you|me)?", r"(yourself|me)", r"[a-z]{3}", r"(?:off|on)",
+]
+WORDS = [
+    "fuck", "f*ck", "FUCK", "bomb", "bomb1", "bob", "blob", "kill", "hurt", "you", "me",
+    "yourself", "off", "on", "ignore", "prompt", "x", "7", "42", "skill", "bombs", "a",
+]
+
+
+def _random_pattern(rng: random.Random) -> str:
+    atoms = [rng.choice(ATOMS) for _ in range(rng.randint(1, 3))]
+    return "".join(atom + rng.choice(["", r"\s+", " ", r"\s*"]) for atom in atoms[:-1]) + atoms[-1]
+
+
+def _random_text(rng: random.Random) -> str:
+    return rng.choice([" ", "  ", "", "! "]).join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+
+
+def _naive_phrase(phrase: str) -> str:
+    return r"(?<!\w)" + r"\s+".join(re.escape(w) for w in normalize_phrase(phrase).split()) + r"(?!\w)"
+
+
+def _naive_match(patterns, phrases, text: str) -> bool:
+    return any(re.search(p, text, re.IGNORECASE) for _, p in patterns) or \
+        any(re.search(_naive_phrase(p), text, re.IGNORECASE) for _, p in phrases)
+
+
+def test_reported_fallback_cases():
+    assert CompiledPack([("insult", r"fuck\s+you"), ("obfuscated", r"f[u*]ck")], []).match("fuck off") == "obfuscated"
+    assert CompiledPack([("a", r"bomb\d"), ("b", r"b\w+b")], []).match("bomb") == "b"
+
+
+def test_matches_naive_search_on_random_rule_sets():
+    rng = random.Random(1234)
+    for _ in range(400):
+        patterns = [(f"r{i}", _random_pattern(rng)) for i in range(rng.randint(1, 6))]
+        phrases = [(f"p{i}", " ".join(rng.choice(WORDS[:12]) for _ in range(rng.randint(1, 2)))) for i in range(rng.randint(0, 3))]
+        pack = CompiledPack(patterns, phrases)
+        for _ in range(25):
+            text = _random_text(rng)
+            expected = _naive_match(patterns, phrases, text)
+            got = pack.match(text)
+            assert (got is not None) == expected, f"rules={patterns} phrases={phrases} text={text!r} got={got}"
+            if got is not None and got.startswith("r"):
+                rule = dict(patterns)[got]
+                assert re.search(rule, text, re.IGNORECASE), f"reported {got} ({rule!r}) does not match {text!r}"
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"PASS {name}")
@@ -0,0 +1,56 @@
+import os
+import sys
+
+# Collision checks for the /chat answer cache: different questions must never share an entry.
+# Run with `python -m pytest tests/test_answer_cache.py` or directly with python.
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services', 'ai-backend'))
+
+from answer_cache import ChatAnswerCache  # noqa: E402
+
+DIFFERENT_QUESTIONS = [
+    ("solve 2x + 3 = 7", "solve 2x + 5 = 9"),
+    ("solve 2x + 3 = 7", "solve 3x + 2 = 7"),
+    ("derivative of x^2", "derivative of x^3"),
+    ("is 7 a prime", "is 9 a prime"),
+    ("why is this not a function", "why is this a function"),
+    ("why isn't this a function", "why is this a function"),
+    ("what is f(x) when x = 2", "what is g(x) when x = 2"),
+]
+
+SAME_QUESTIONS = [
+    ("What is a limit?", "what is a   limit"),
+    ("Explain the chain rule please", "explain the chain rules please"),
+]
+
+
+def _cache_with(question: str) -> ChatAnswerCache:
+    cache = ChatAnswerCache()
+    cache.put("course", question, 1, f"answer to {question}", True)
+    return cache
+
+
+def test_different_questions_do_not_collide():
+    for cached, asked in DIFFERENT_QUESTIONS:
+        for a, b in ((cached, asked), (asked, cached)):
+            hit = _cache_with(a).get("course", b, 1)
+            assert hit is None, f"{b!r} was served the answer to {a!r}"
+
+
+def test_same_question_hits():
+    for cached, asked in SAME_QUESTIONS:
+        hit = _cache_with(cached).get("course", asked, 1)
+        assert hit == (f"answer to {cached}", True), f"{asked!r} missed {cached!r}"
+
+
+def test_stale_version_misses():
+    cache = _cache_with("what is a limit")
+    assert cache.get("course", "what is a limit", 2) is None
+    assert cache.get("course", "what is a limit", 1) is None  # dropped as stale
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"PASS {name}")
@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Checks for the write-behind debit path (services/ai-backend/debit_batcher.py).
+# Run with `python -m pytest tests/test_debit_batcher.py` or directly with python.
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services', 'ai-backend'))
+# economy.py opens its ledger at import; keep it out of the repo's data/ directory.
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+
+from economy import EconomySystem  # noqa: E402
+from economy_ledger import SQLiteLedger  # noqa: E402
+from debit_batcher import DebitBatcher  # noqa: E402
+
+
+def _economy(directory: str, cap: float) -> EconomySystem:
+    system = EconomySystem.__new__(EconomySystem)
+    system.use_firestore = False
+    system.ledger = SQLiteLedger(os.path.join(directory, "economy.db"), cap)
+    system.batcher = DebitBatcher(system.ledger, os.path.join(directory, "pending.json"))
+    return system
+
+
+def test_direct_spend_can_use_own_lease():
+    with tempfile.TemporaryDirectory() as directory:
+        system = _economy(directory, 4.0)
+        assert system.spend("u", 0.1, "chat")  # leases 2.0 of the 4.0 balance
+        assert system.spend("u", 2.5, "course")  # too big for the lease: goes to the ledger
+        assert abs(system.ledger.get_user_state("u")["balance"] - 1.4) < 1e-9
+        assert system.batcher.unsettled("u") == 0.0
+
+
+def test_direct_spend_still_respects_balance():
+    with tempfile.TemporaryDirectory() as directory:
+        system = _economy(directory, 4.0)
+        assert system.spend("u", 0.1, "chat")
+        assert not system.spend("u", 4.0, "course")
+        assert abs(system.check_balance("u") - 3.9) < 1e-9
+
+
+def test_slow_reserve_does_not_block_other_users():
+    with tempfile.TemporaryDirectory() as directory:
+        system = _economy(directory, 4.0)
+        batcher = system.batcher
+        assert batcher.spend("fast", 0.1, "chat") is not None  # lease already held
+        reserve, entered, unblock = batcher.ledger.reserve, threading.Event(), threading.Event()
+
+        def slow_reserve(*args, **kwargs):
+            entered.set()
+            unblock.wait(5)
+            return reserve(*args, **kwargs)
+
+        batcher.ledger.reserve = slow_reserve
+        slow = threading.Thread(target=batcher.spend, args=("slow", 0.1, "chat"))
+        slow.start()
+        assert entered.wait(5)
+        start = time.perf_counter()
+        assert batcher.spend("fast", 0.1, "chat") is not None
+        assert time.perf_counter() - start < 1.0
+        unblock.set()
+        slow.join(5)
+        assert batcher.unsettled("slow") == 0.1
+
+
+def test_failed_journal_write_applies_nothing():
+    with tempfile.TemporaryDirectory() as directory:
+        system = _economy(directory, 4.0)
+        batcher = system.batcher
+        assert batcher.spend("u", 0.1, "chat") is not None
+        write = batcher.journal.set
+
+        def failing_set(*args, **kwargs):
+            raise OSError("disk full")
+
+        batcher.journal.set = failing_set
+        assert batcher.spend("u", 0.1, "chat") is None
+        assert abs(batcher.stats()["leased_obols"] - 1.9) < 1e-9
+        assert abs(batcher.unsettled("u") - 0.1) < 1e-9
+        batcher.journal.set = write
+        assert abs(batcher.spend("u", 0.1, "chat") - 1.8) < 1e-9
+
+
+def test_journal_write_does_not_hold_global_lock():
+    with tempfile.TemporaryDirectory() as directory:
+        batcher = _economy(directory, 4.0).batcher
+        write, entered, unblock = batcher.journal.set, threading.Event(), threading.Event()
+
+        def slow_set(*args, **kwargs):
+            entered.set()
+            unblock.wait(5)
+            return write(*args, **kwargs)
+
+        batcher.journal.set = slow_set
+        slow = threading.Thread(target=batcher.spend, args=("u", 0.1, "chat"))
+        slow.start()
+        assert entered.wait(5)
+        start = time.perf_counter()
+        batcher.stats()
+        assert time.perf_counter() - start < 1.0
+        unblock.set()
+        slow.join(5)
+        assert abs(batcher.unsettled("u") - 0.1) < 1e-9
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"PASS {name}")
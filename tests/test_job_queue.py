@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Checks for the background job table (services/ai-backend/job_queue.py).
+# Run with `python -m pytest tests/test_job_queue.py` or directly with python.
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services', 'ai-backend'))
+
+from job_queue import JobQueue, SUCCEEDED  # noqa: E402
+
+
+def _queue(directory: str) -> JobQueue:
+    return JobQueue(os.path.join(directory, "jobs.json"), workers=1, results_dir=os.path.join(directory, "results"))
+
+
+def test_results_live_outside_the_table_and_survive_restart():
+    directory = tempfile.mkdtemp()
+    structure = {"modules": [{"title": f"Module {i}", "lessons": ["x" * 200] * 10} for i in range(20)]}
+
+    async def run():
+        queue = _queue(directory)
+        writes = []
+        write = queue._write
+        queue._write = lambda table, expired: (writes.append(table), write(table, expired))
+        await queue.start()
+
+        async def job(handle):
+            for i in range(100):
+                handle.progress(i / 100, "Working")
+                await asyncio.sleep(0)
+            return structure
+
+        job_id = queue.submit("generate-course", job)["id"]
+        while queue.get(job_id)["status"] != SUCCEEDED:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job_id, len(writes)
+
+    job_id, writes = asyncio.run(run())
+    assert writes <= 5, f"{writes} table writes for one job"
+    with open(os.path.join(directory, "jobs.json")) as f:
+        table = json.load(f)
+    assert table[job_id]["status"] == SUCCEEDED and "result" not in table[job_id]
+
+    restarted = _queue(directory)
+    assert restarted.get(job_id)["result"] is None
+    assert asyncio.run(restarted.fetch(job_id))["result"] == structure
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"PASS {name}")
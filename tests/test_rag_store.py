@@ -0,0 +1,106 @@
+import os
+import sys
+import tempfile
+import threading
+
+# Checks for the sharded RAG store (services/ai-backend/vector_store.py).
+# Run with `python -m pytest tests/test_rag_store.py` or directly with python.
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services', 'ai-backend'))
+
+import numpy as np  # noqa: E402
+from dense_index import DenseIndex  # noqa: E402
+from search_index import query_terms  # noqa: E402
+from vector_store import ShardedVectorStore  # noqa: E402
+
+
+def _doc(n_chunks: int, version: int) -> dict:
+    chunks = [{"text": f"derivative limit chain rule part {i} v{version}", "difficulty": 1 + i % 10} for i in range(n_chunks)]
+    return {"filename": "notes.pdf", "course_id": "calc", "chunks": chunks, "text_content": ""}
+
+
+def _search(shard, terms, query):
+    """The per-shard part of RAGService.search_context."""
+    with shard.lock:
+        keys = [key for _, key in shard.index.search(terms, limit=20)] + [key for _, key in shard.dense.search(query, limit=20)]
+        return [shard.chunk(key) for key in keys]
+
+
+def test_search_during_reingest():
+    store = ShardedVectorStore(tempfile.mkdtemp())
+    rng = np.random.default_rng(0)
+    store.put_document("calc", "calc_notes.pdf", _doc(40, 0))
+    errors, stop = [], threading.Event()
+
+    def ingest():
+        for version in range(1, 60):
+            n = int(rng.integers(1, 80))
+            vectors = rng.standard_normal((n, 8)).astype(np.float32)
+            store.put_document("calc", "calc_notes.pdf", _doc(n, version), vectors=vectors)
+        stop.set()
+
+    def search():
+        shard = store.get_shard("calc")
+        terms = query_terms("derivative chain rule")
+        query = np.ones(8, dtype=np.float32)
+        while not stop.is_set():
+            try:
+                _search(shard, terms, query)
+            except Exception as e:  # noqa: BLE001
+                errors.append(repr(e))
+                return
+
+    threads = [threading.Thread(target=search) for _ in range(4)] + [threading.Thread(target=ingest)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    assert not errors, errors[:3]
+
+
+def test_loaded_shards_does_not_load_cold_courses():
+    root = tempfile.mkdtemp()
+    writer = ShardedVectorStore(root)
+    for course_id in ("calc", "algebra", "geometry"):
+        writer.put_document(course_id, f"{course_id}_notes.pdf", _doc(3, 0))
+    store = ShardedVectorStore(root)
+    assert store.loaded_shards() == []
+    store.get_shard("algebra")
+    assert [s.course_id for s in store.loaded_shards()] == ["algebra"]
+    assert store.stats()["loaded"] == ["algebra"]
+
+
+def test_dense_search_sees_whole_snapshots():
+    dense = DenseIndex(os.path.join(tempfile.mkdtemp(), "calc"))
+    rng = np.random.default_rng(1)
+    errors, stop = [], threading.Event()
+
+    def replace():
+        for version in range(200):
+            n = int(rng.integers(1, 50))
+            dense.replace_document("notes", rng.standard_normal((n, 8)).astype(np.float32), [1 + version % 10] * n)
+        stop.set()
+
+    def search():
+        query = np.ones(8, dtype=np.float32)
+        while not stop.is_set():
+            try:
+                for _, (_, position) in dense.search(query, 1, 10, limit=50):
+                    assert position < 50
+            except Exception as e:  # noqa: BLE001
+                errors.append(repr(e))
+                return
+
+    threads = [threading.Thread(target=search) for _ in range(4)] + [threading.Thread(target=replace)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    assert not errors, errors[:3]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"PASS {name}")